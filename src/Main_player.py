@@ -1,5 +1,4 @@
 import pygame
-import pynput
 from sys import exit
 import threading
 import random
@@ -8,6 +7,9 @@ import media_handler
 import numpy as np
 import time
 import os
+import pickle
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from pygame import freetype
 # Initialize Pygame
 pygame.init()
@@ -17,101 +19,213 @@ clock = pygame.time.Clock()
 # main_font = pygame.font.Font(None, 24)
 main_font = pygame.freetype.SysFont("bizudminchomedium", 24, bold=True)
 # main_font = pygame.freetype.SysFont("Meiryo UI", 24, bold=True)
+label_font = UI_Widgets.GlyphAtlas(main_font)#the media labels get drawn a lot, so they use pre-baked glyphs
 pygame.display.toggle_fullscreen()
+#only let through the events that get handled, everything else would just be pulled off the queue and thrown away every frame
+#window focus/expose are kept so the event wait wakes up right away to redraw, the focus itself is still polled with pygame.key.get_focused()
+#TEXTINPUT has to stay allowed too, pygame fills KEYDOWN's unicode from it and it's the only event that carries shifted/IME characters
+HANDLED_EVENT_TYPES = [pygame.QUIT, pygame.KEYDOWN, pygame.TEXTINPUT, pygame.MOUSEWHEEL, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.WINDOWFOCUSGAINED, pygame.WINDOWEXPOSED]
+pygame.event.set_blocked(None)
+pygame.event.set_allowed(HANDLED_EVENT_TYPES + [pygame.MOUSEMOTION])
 
 exit_flag = False
 is_paused = True
 is_shuffling = False
 click_data = [False,False,False]
+click_bits = 0 #same as click_data but packed into an int, bit 0 is LMB, bit 1 is MMB, bit 2 is RMB
 was_focused = False
+dirty = True #set whenever something on screen might have changed, the loop only renders when this is set
+needs_full_update = True #the first frame (and any frame after we lose focus) has to push the whole screen, after that only the changed rects are pushed
+ACTIVE_FRAME_RATE = 30 #while playing or while the mouse/keyboard is being used
+IDLE_FRAME_RATE = 10 #while nothing is playing and nobody is touching anything
+FRAME_INTERVAL_MS = 1000 // ACTIVE_FRAME_RATE #how long a frame lasts while something is playing
+BUSY_LOOP_MARGIN_MS = 2 #how early we stop sleeping on events so tick_busy_loop can hit the frame time exactly
+IDLE_EVENT_TIMEOUT_MS = 250 #how long we wait for events when nothing is moving on screen
+last_tick_time = 0
 
 def toggle_pause():
     global audio_player
     global playback_button
     audio_player.toggle_pause()
-    if playback_button.display_image == "default":
-        playback_button.display_image = "toggle"
-    elif playback_button.display_image == "hover":
-        playback_button.display_image = "hover toggle"
-    elif playback_button.display_image == "toggle":
-        playback_button.display_image = "default"
-    elif playback_button.display_image == "hover toggle":
-        playback_button.display_image = "hover"
-
-
-# Create a keyboard listener
-def CreateListener():
-    with pynput.keyboard.Listener(on_press=on_key_release) as listener:
-        listener.join()
-    return threading.current_thread()
-# Define a callback function to handle key events
-def on_key_release(key):
-    try:
-        global audio_player
-        global text_input
-        if text_input.is_focused:
-            text_input.handle_key_press(key)
+    if playback_button.state == UI_Widgets.ButtonState.DEFAULT:
+        playback_button.state = UI_Widgets.ButtonState.TOGGLE
+    elif playback_button.state == UI_Widgets.ButtonState.HOVER:
+        playback_button.state = UI_Widgets.ButtonState.HOVER_TOGGLE
+    elif playback_button.state == UI_Widgets.ButtonState.TOGGLE:
+        playback_button.state = UI_Widgets.ButtonState.DEFAULT
+    elif playback_button.state == UI_Widgets.ButtonState.HOVER_TOGGLE:
+        playback_button.state = UI_Widgets.ButtonState.HOVER
+
+
+# Handles KEYDOWN events from pygame. pygame only sends these while the window is focused, so there's no need to check for that here
+def on_key_press(event):
+    global audio_player
+    global text_input
+    global dirty
+    dirty = True
+    if text_input.is_focused:
+        text_input.handle_key_event(event)
+    else:
+        if event.key == pygame.K_RCTRL:
+            toggle_pause()
         else:
-            if key.name == "ctrl_r":
+            # IsFocused = pygame.key.get_focused() #All of this was for a previous version. I might re-impliment this however it's unlikely because I'd have to change up how much space the audio visualizer takes too
+            # if event.key == pygame.K_TAB and IsFocused:
+            #     global SidebarVisibility
+            #     SidebarVisibility = not SidebarVisibility
+            if event.key == pygame.K_SPACE:
                 toggle_pause()
-            else:
-                # IsFocused = pygame.key.get_focused() #All of this was for a previous version. I might re-impliment this however it's unlikely because I'd have to change up how much space the audio visualizer takes too
-                # if key.name == "tab" and IsFocused:
-                #     global SidebarVisibility
-                #     SidebarVisibility = not SidebarVisibility
-                if key.name == "space" and is_focused:
-                    toggle_pause()
-                elif key.name == "esc" and is_focused:
-                    global exit_flag 
-                    exit_flag = True
-                    exit()
-    except AttributeError:
-        pass
+            elif event.key == pygame.K_ESCAPE:
+                global exit_flag
+                exit_flag = True
+
+# Handles TEXTINPUT events, which is where the typed characters come from (KEYDOWN is only used for the control keys)
+def on_text_input(event):
+    global text_input
+    global dirty
+    if text_input.is_focused:
+        dirty = True
+        text_input.handle_text_event(event)
 
 file_manager = media_handler.FileManager()
 
 
+def is_audio_playing():
+    return not audio_player.no_audio_loaded.is_set() and audio_player.is_playback_unpaused.is_set()
+
 def pygame_event_handling():
-    for event in pygame.event.get():
+    """
+    Waits for and handles pygame events. Returns True if any input came in.
+    """
+    global exit_flag
+    global dirty
+    global needs_full_update
+    #block until something happens instead of spinning, but wake up in time for the next visualizer/progress bar update
+    if is_audio_playing():
+        #wake up just before the next frame is due, tick_busy_loop takes care of the last couple of ms
+        timeout = max(1, FRAME_INTERVAL_MS - (pygame.time.get_ticks() - last_tick_time) - BUSY_LOOP_MARGIN_MS)
+    else:
+        timeout = IDLE_EVENT_TIMEOUT_MS
+    first_event = pygame.event.wait(timeout=timeout)
+    #a high polling rate mouse can queue dozens of motion events per frame, but all that matters is that it moved (the position gets polled), so drop them in one go
+    had_input = first_event.type == pygame.MOUSEMOTION or pygame.event.peek(pygame.MOUSEMOTION)
+    pygame.event.clear(pygame.MOUSEMOTION)
+    events = pygame.event.get(HANDLED_EVENT_TYPES)
+    if first_event.type in HANDLED_EVENT_TYPES:
+        events.insert(0, first_event)
+    for event in events:
+        if event.type in (pygame.MOUSEWHEEL, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.KEYDOWN, pygame.TEXTINPUT):
+            had_input = True
+        if event.type in (pygame.WINDOWFOCUSGAINED, pygame.WINDOWEXPOSED):
+            needs_full_update = True
+            dirty = True
         if event.type == pygame.QUIT:
             exit_flag = True
+        if event.type == pygame.KEYDOWN:
+            on_key_press(event)
+        if event.type == pygame.TEXTINPUT:
+            on_text_input(event)
         if event.type == pygame.MOUSEWHEEL:
             if event.y > 0:
                 media_display.scroll_position = max(media_display.scroll_position - media_display.scroll_sensitivity, 0)
             elif event.y < 0:
                 media_display.scroll_position = min(media_display.scroll_position + media_display.scroll_sensitivity, media_display.get_max_scroll(950))
+    if had_input:
+        dirty = True
+    return had_input
 
-ui_asset_folder = os.path.dirname(__file__) + r"\UI Assets"
+ui_asset_folder = Path(os.path.dirname(__file__), "UI Assets")#Path so this works off of windows too
 NecessaryImages = {
-    "Play": ui_asset_folder+r"\Play Button (Dark).png",
-    "Play Hover": ui_asset_folder+r"\Play Button (Dark Hovered).png",
-    "Pause": ui_asset_folder+r"\Pause Button (Dark).png",
-    "Pause Hover": ui_asset_folder+r"\Pause Button (Dark Hovered).png",
-    "Shuffle": ui_asset_folder+r"\Shuffle (Smooth).png",
-    "Shuffle Highlight": ui_asset_folder+r"\Shuffle Highlighted (Smooth).png",
-    "Top Bar": ui_asset_folder+r"\Top Bar (Dark).png",
-    "Sidebar": ui_asset_folder+r"\Sidebar Default.png",
-    "Load": ui_asset_folder+r"\Load.png",
-    "Label": ui_asset_folder+r"\Label (476x50).png",
-    "Label Hover": ui_asset_folder+r"\Label (Highlighted).png",
-    "Label Select": ui_asset_folder+r"\Label (Selected).png",
-    "Volume": ui_asset_folder+r"\Volume.png",
-    "Volume Holder": ui_asset_folder+r"\Volume Holder.png",
-    "Text Input": ui_asset_folder+r"\Text Input.png",
+    "Play": ui_asset_folder/"Play Button (Dark).png",
+    "Play Hover": ui_asset_folder/"Play Button (Dark Hovered).png",
+    "Pause": ui_asset_folder/"Pause Button (Dark).png",
+    "Pause Hover": ui_asset_folder/"Pause Button (Dark Hovered).png",
+    "Shuffle": ui_asset_folder/"Shuffle (Smooth).png",
+    "Shuffle Highlight": ui_asset_folder/"Shuffle Highlighted (Smooth).png",
+    "Top Bar": ui_asset_folder/"Top Bar (Dark).png",
+    "Sidebar": ui_asset_folder/"Sidebar Default.png",
+    "Load": ui_asset_folder/"Load.png",
+    "Label": ui_asset_folder/"Label (476x50).png",
+    "Label Hover": ui_asset_folder/"Label (Highlighted).png",
+    "Label Select": ui_asset_folder/"Label (Selected).png",
+    "Volume": ui_asset_folder/"Volume.png",
+    "Volume Holder": ui_asset_folder/"Volume Holder.png",
+    "Text Input": ui_asset_folder/"Text Input.png",
 }
+atlas_cache_path = ui_asset_folder/"ui_atlas.cache"
+
+def build_atlas(image_paths):
+    """
+    Packs every image into one surface, row by row, tallest images first.
+    Returns the atlas surface and a dictionary of where each image ended up in it.
+    """
+    #pygame.image.load lets go of the GIL while it decodes, so the PNGs can all be decoded at the same time
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+        futures = {label: pool.submit(pygame.image.load, path) for label, path in image_paths.items()}
+    images = {label: future.result() for label, future in futures.items()}
+    atlas_width = max(image.get_width() for image in images.values())
+    positions = {}
+    x, y, row_height = 0, 0, 0
+    for label, image in sorted(images.items(), key=lambda item: item[1].get_height(), reverse=True):
+        if x + image.get_width() > atlas_width:
+            x, y, row_height = 0, y + row_height, 0
+        positions[label] = (x, y)
+        x += image.get_width()
+        row_height = max(row_height, image.get_height())
+
+    atlas = pygame.Surface((atlas_width, y + row_height), pygame.SRCALPHA)
+    atlas.fill((0, 0, 0, 0))
+    rects = {}
+    for label, image in images.items():
+        #RGBA_MAX onto a fully transparent surface copies the pixels as they are, a normal blit would blend the alpha in
+        rects[label] = atlas.blit(image, positions[label], special_flags=pygame.BLEND_RGBA_MAX)
+    return atlas, rects
+
+def load_atlas(image_paths, cache_path):
+    """
+    Loads the atlas from cache_path if none of the images changed since it was written, otherwise builds it again and rewrites the cache.
+    """
+    sources = {label: (str(path), os.path.getmtime(path)) for label, path in image_paths.items()}
+    try:
+        with open(cache_path, "rb") as cache_file:
+            cache = pickle.load(cache_file)
+        if cache["sources"] == sources:
+            atlas = pygame.image.frombytes(cache["pixels"], cache["size"], "RGBA")
+            return atlas, {label: pygame.Rect(rect) for label, rect in cache["rects"].items()}
+    except (OSError, EOFError, KeyError, ValueError, pickle.UnpicklingError):
+        pass #no cache or a broken one, just rebuild it
+
+    atlas, rects = build_atlas(image_paths)
+    cache = {
+        "sources": sources,
+        "size": atlas.get_size(),
+        "rects": {label: tuple(rect) for label, rect in rects.items()},
+        "pixels": pygame.image.tobytes(atlas, "RGBA"),
+    }
+    try:
+        with open(cache_path, "wb") as cache_file:
+            pickle.dump(cache, cache_file)
+    except OSError:
+        pass #not being able to write the cache just means the next startup is slower
+    return atlas, rects
 
 #Now loading stuff
+#everything lives in one atlas surface, and loaded_images holds subsurfaces of it so the widgets can use them like normal surfaces
+#converting to the display's pixel format here means blits in the render loop don't have to convert every pixel every frame
+#this has to happen after set_mode, which is done at the top of the file
+ui_atlas, ui_atlas_rects = load_atlas(NecessaryImages, atlas_cache_path)
+ui_atlas = ui_atlas.convert_alpha()
 loaded_images = {}
-for label,path in NecessaryImages.items():
-    loaded_images[label] = pygame.image.load(path)
+for label, rect in ui_atlas_rects.items():
+    loaded_images[label] = ui_atlas.subsurface(rect)
 
 #widget initialization
 playback_button = UI_Widgets.Button(loaded_images["Play"], extra_images={"toggle":loaded_images["Pause"],"hover":loaded_images["Play Hover"],"hover toggle":loaded_images["Pause Hover"]})
-playback_button.position = (1920/2,130) - playback_button.image_info["default"][1]/2
+playback_button.position = pygame.Vector2((1920/2,130)) - pygame.Vector2(playback_button.image_info["default"][1])/2
 
 
 shuffler_button = UI_Widgets.Button(loaded_images["Shuffle"],extra_images={"toggle":loaded_images["Shuffle Highlight"]})
-shuffler_button.position = (1920-128,65) - shuffler_button.image_info["default"][1]/2
+shuffler_button.position = pygame.Vector2((1920-128,65)) - pygame.Vector2(shuffler_button.image_info["default"][1])/2
 
 text_input = UI_Widgets.TextInput(loaded_images["Text Input"],main_font,position=((1100),40), text_color=(0,255,255))
 download_progress_bar = UI_Widgets.ProgressBar(3,635,position=((1100),40+50+2))
@@ -125,7 +239,7 @@ shuffler_button.on_toggle_call = lambda: toggle_shuffle()
 shuffler_button.on_untoggle_call = lambda:toggle_shuffle()
 
 load_file_button = UI_Widgets.Button(loaded_images["Load"], is_toggle_button=False)
-load_file_button.position = (128,65) - load_file_button.image_info["default"][1]/2
+load_file_button.position = pygame.Vector2((128,65)) - pygame.Vector2(load_file_button.image_info["default"][1])/2
 
 def start_load_file_dialog():
     def thread_function():
@@ -147,13 +261,10 @@ volume_container = UI_Widgets.WidgetImage(loaded_images["Volume Holder"],positio
 volume_icon = UI_Widgets.WidgetImage(loaded_images["Volume"],position=(860,19))
 
 
-
-KeyListenerThread = threading.Thread(target=CreateListener, daemon=True)
-KeyListenerThread.start()
-
 audio_player = media_handler.AudioPlayer(display_frame_chunk_ratio=20, display_skip_rate=4)
 
 audio_visualizer = UI_Widgets.AudioVisualizer(audio_player, 1440, 950, pygame.Vector2(480,130))
+audio_visualizer.start_update_thread(mode="channels")
 
 yt_manager = media_handler.YoutubeManager(target_mode="audio")
 
@@ -167,6 +278,11 @@ playback_button.on_toggle_call = lambda: audio_player.pause_audio()
 playback_button.on_untoggle_call = lambda: audio_player.unpause_audio()
 
 focused_button = None
+last_progress_pixel = -1
+last_visualizer_version = 0
+last_download_progress = None
+was_downloading = True #starts True so the bar gets its initial value on the first frame
+last_volume = None
 
 
 ui_layer_01 = [sidebar_image, audio_visualizer]
@@ -177,11 +293,12 @@ ui_layer_3 = [playback_button,shuffler_button,load_file_button,media_progress_ba
 node_tree = UI_Widgets.Node([ui_layer_01,ui_layer_1,ui_layer_2,ui_layer_3])
 
 while True:
-    screen.fill((0,0,0))
-    pygame_event_handling()
+    had_input = pygame_event_handling()
     is_focused = pygame.key.get_focused()
     if is_focused and not was_focused:
         audio_player.is_window_focused.set()
+        dirty = True
+        needs_full_update = True
     elif was_focused and not is_focused:
         audio_player.is_window_focused.clear()
     if exit_flag:
@@ -191,33 +308,76 @@ while True:
     #mouse handling
     mouse_position = pygame.mouse.get_pos()
     new_click_data = pygame.mouse.get_pressed()
-    click_comparer = [new != old and new for new, old in zip(new_click_data, click_data)]# if they aren't the same and the new thing is pressed, return true
-    mouse_state_changed = any(click_comparer)
-    if new_click_data != click_data and new_click_data[0]:#this evaluates to true when you click on this with LMB
+    new_click_bits = new_click_data[0] | (new_click_data[1] << 1) | (new_click_data[2] << 2)
+    click_comparer = (new_click_bits ^ click_bits) & new_click_bits# a bit is set if that button wasn't pressed last frame and is pressed now
+    mouse_state_changed = click_comparer != 0
+    if click_comparer & 1:#this evaluates to true when you click on this with LMB
         text_input.is_focused = False
-    audio_visualizer.update_audio_display_data(audio_player.get_display_frames(), mode="channels")
-
-    node_tree.handle_mouse(mouse_position,new_click_data,click_data)
-    file_manager.load_media(media_display,loaded_images["Label"],font=main_font,extra_images={"hover":loaded_images["Label Hover"],"toggle":loaded_images["Label Select"]})
+    if audio_visualizer.display_data_version != last_visualizer_version:
+        #the visualizer's own thread finished processing a new chunk of audio, so there's something new to draw
+        last_visualizer_version = audio_visualizer.display_data_version
+        dirty = True
+
+    #read once here and passed down the tree, the widgets never ask pygame for the mouse themselves
+    mouse_frame = UI_Widgets.MouseFrame(
+        pos=mouse_position,
+        pressed=new_click_data,
+        prev_pressed=click_data,
+        released=click_bits & ~new_click_bits,
+        changed=new_click_bits ^ click_bits,
+    )
+    node_tree.handle_mouse(mouse_frame)
+    if file_manager.load_media(media_display,loaded_images["Label"],font=label_font,extra_images={"hover":loaded_images["Label Hover"],"toggle":loaded_images["Label Select"]}):
+        dirty = True
     if audio_player.audio_frames > 0:
         media_progress_bar.progress = audio_player.current_frame/audio_player.audio_frames
+        progress_pixel = int(media_progress_bar.progress*media_progress_bar.length)
+        if progress_pixel != last_progress_pixel:
+            last_progress_pixel = progress_pixel
+            dirty = True
     if audio_player.no_audio_loaded.is_set() and audio_player.audio_frames > 0:
         #if we didn't just load the thing and nothing's playing, do this
+        dirty = True
         if is_shuffling:
             media_display.random_toggle()
         else:
             media_display.sequential_toggle()
 
-    download_progress_bar.progress = yt_manager.check_download_progress()
-    audio_player.set_volume(volume_bar.progress)
+    #only poll while a download is running, plus one last time on the frame it finishes so the bar ends up at its final value
+    is_downloading = yt_manager.is_downloading.is_set()
+    if is_downloading or was_downloading:
+        download_progress_bar.progress = yt_manager.check_download_progress()
+        if download_progress_bar.progress != last_download_progress:
+            last_download_progress = download_progress_bar.progress
+            dirty = True
+    was_downloading = is_downloading
+    if volume_bar.progress != last_volume:
+        #set_volume takes the audio lock, so only bother when the slider actually moved
+        audio_player.set_volume(volume_bar.progress)
+        last_volume = volume_bar.progress
     click_data = new_click_data
+    click_bits = new_click_bits
     mouseover_not_found = True
     #end of mouse handling
-    if is_focused:
-        node_tree.render(screen)
-        pygame.display.update()
-
-    clock.tick(30)
+    if is_focused and dirty:
+        #the whole frame still gets redrawn because the layers overlap, but only the parts that changed get copied to the display
+        screen.fill((0,0,0))
+        dirty_rects = node_tree.render(screen)
+        if needs_full_update:
+            pygame.display.update()
+            needs_full_update = False
+        elif dirty_rects:
+            pygame.display.update(dirty_rects)
+        dirty = False
+
+    if is_audio_playing():
+        #the visualizer is moving, so hit the frame time exactly instead of letting SDL_Delay oversleep and jitter
+        clock.tick_busy_loop(ACTIVE_FRAME_RATE)
+    elif had_input:
+        clock.tick(ACTIVE_FRAME_RATE)
+    else:
+        clock.tick(IDLE_FRAME_RATE)
+    last_tick_time = pygame.time.get_ticks()
     was_focused = is_focused
 
     
\ No newline at end of file
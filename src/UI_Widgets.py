@@ -2,11 +2,132 @@ import pygame
 import numpy as np
 import random
 from typing import Dict, List, Tuple, Optional, Union, Callable
-import pynput
+from enum import IntEnum
+from collections import namedtuple, OrderedDict
+from functools import lru_cache
 import pyperclip as clipboard
+import threading
+import weakref
 
 
-class Button:
+# Everything the widgets need to know about the mouse for one frame. This gets read from pygame once per frame and handed down
+# the Node tree, so no widget has to ask pygame for the mouse state itself.
+# pos is the mouse position, pressed is this frame's button states, prev_pressed is last frame's,
+# released and changed are bitmasks (bit 0 is LMB, bit 1 is MMB, bit 2 is RMB) of the buttons that were let go of / changed state this frame.
+MouseFrame = namedtuple("MouseFrame", "pos pressed prev_pressed released changed")
+
+
+class ButtonState(IntEnum):
+    """
+    What a button is currently showing. These used to be compared as strings every frame, ints are a lot cheaper.
+    """
+    DEFAULT = 0
+    HOVER = 1
+    TOGGLE = 2
+    HOVER_TOGGLE = 3
+
+BUTTON_STATE_KEYS = ("default", "hover", "toggle", "hover toggle") #the image_info key for each ButtonState, in order
+_KEY_TO_BUTTON_STATE = {key: ButtonState(index) for index, key in enumerate(BUTTON_STATE_KEYS)}
+
+
+MOUSEOVER_ALPHA_THRESHOLD = 125 #pixels with more alpha than this count as part of a button
+_alpha_mask_cache = weakref.WeakKeyDictionary() #buttons that share an image (like every playlist label) share its mask too
+
+def get_alpha_mask(image: pygame.Surface) -> np.ndarray:
+    """
+    Gets a boolean (width, height) array that is True wherever the image is opaque enough to count for mouseovers.
+    Masks are only worked out once per surface.
+
+    Args:
+        image (pygame.Surface): The image to get the mask of.
+
+    Returns:
+        np.ndarray: The mask, indexed as mask[x, y].
+    """
+    mask = _alpha_mask_cache.get(image)
+    if mask is None:
+        mask = pygame.surfarray.array_alpha(image) > MOUSEOVER_ALPHA_THRESHOLD
+        _alpha_mask_cache[image] = mask
+    return mask
+
+
+_converted_image_cache = weakref.WeakKeyDictionary()
+_display_alpha_format = None #(bitsize, masks) convert_alpha() gives, worked out the first time it's needed
+
+def get_display_alpha_format() -> Optional[tuple]:
+    """
+    Gets the pixel format convert_alpha() converts to, so images that are already in it can be left alone.
+
+    Returns:
+        Optional[tuple]: (bitsize, masks), or None if there's no display yet.
+    """
+    global _display_alpha_format
+    if _display_alpha_format is None:
+        try:
+            probe = pygame.Surface((1, 1), pygame.SRCALPHA).convert_alpha()
+        except pygame.error:
+            return None #no display mode set yet
+        _display_alpha_format = (probe.get_bitsize(), probe.get_masks())
+    return _display_alpha_format
+
+def get_converted_image(image: pygame.Surface) -> pygame.Surface:
+    """
+    Gets a convert_alpha() copy of an image so blitting it doesn't need a pixel format conversion every time.
+    Images already in the display's format (like subsurfaces of an atlas that was converted) are returned as they are, a copy would just double their memory.
+    Copies are cached per image, so buttons that share an image keep sharing it.
+    If there's no display yet the image is returned as it is.
+
+    Args:
+        image (pygame.Surface): The image to convert.
+
+    Returns:
+        pygame.Surface: The converted image.
+    """
+    display_format = get_display_alpha_format()
+    if display_format is None:
+        return image #no display mode set yet
+    if image.get_flags() & pygame.SRCALPHA and (image.get_bitsize(), image.get_masks()) == display_format:
+        return image
+    converted = _converted_image_cache.get(image)
+    if converted is None:
+        converted = image.convert_alpha()
+        _converted_image_cache[image] = converted
+    return converted
+
+
+class DirtyRectTracker:
+    """
+    Small mixin for widgets that report which parts of the screen they changed when rendered.
+    The whole frame still gets redrawn, but only the returned rects need to be pushed to the display with pygame.display.update(rects).
+    Widgets that use __slots__ have to list _last_render_state and _last_drawn_rect themselves and set them to None in __init__, the class level defaults below only cover widgets with a __dict__.
+    """
+    __slots__ = ()
+    _last_render_state = None
+    _last_drawn_rect = None
+
+    def track_dirty_rects(self, render_state, drawn_rect: Optional[pygame.Rect]) -> List[pygame.Rect]:
+        """
+        Compares what was just drawn with what was drawn last frame.
+
+        Args:
+            render_state: Anything comparable that fully describes what was drawn. None if nothing was drawn.
+            drawn_rect (pygame.Rect, optional): The area that was drawn to this frame.
+
+        Returns:
+            List[pygame.Rect]: The old and new areas if anything changed, otherwise an empty list.
+        """
+        dirty_rects = []
+        if render_state != self._last_render_state:
+            if self._last_drawn_rect is not None:
+                dirty_rects.append(self._last_drawn_rect)
+            if drawn_rect is not None:
+                dirty_rects.append(drawn_rect)
+        self._last_render_state = render_state
+        self._last_drawn_rect = drawn_rect
+        return dirty_rects
+
+
+class Button(DirtyRectTracker):
     """
     A simple button object that displays a default image when drawn unless another image index is given.
     The reason that is_mouseover doesn't auto render with the hover image or default when false is because that is not always desireable, and can be done simply with:
@@ -16,6 +137,8 @@ class Button:
     else:
         Btn.render(screen)
     """
+    __slots__ = ("image_info", "_state_images", "_position", "state", "is_toggle", "on_toggle_call", "on_untoggle_call", "_last_render_state", "_last_drawn_rect")
+
     def __init__(self, default_image: pygame.Surface, extra_images: Optional[Dict[str, pygame.Surface]] = None, position: pygame.Vector2 = pygame.Vector2(), is_toggle_button:bool = True) -> None:
         """
         Initializes a Button object.
@@ -34,19 +157,65 @@ class Button:
         if extra_images and not all(isinstance(image, pygame.Surface) for image in extra_images.values()):
             raise ValueError("All values in extra_images must be of type pygame.Surface")
 
-        self.image_info = {"default": [default_image, pygame.Vector2(default_image.get_width(), default_image.get_height())]}
+        default_image = get_converted_image(default_image)
+        #(surface, (width, height), alpha mask)
+        self.image_info = {"default": (default_image, default_image.get_size(), get_alpha_mask(default_image))}
 
         if extra_images is not None:
             for key, image in extra_images.items():
-                self.image_info[key] = [image, pygame.Vector2(image.get_width(), image.get_height())]
+                image = get_converted_image(image)
+                self.image_info[key] = (image, image.get_size(), get_alpha_mask(image))
 
-        self.position: pygame.Vector2 = position
-        self.display_image = "default"
+        self.position = position
+        self.state = ButtonState.DEFAULT
         self.is_toggle = is_toggle_button
         self.on_toggle_call = None
         self.on_untoggle_call = None
+        self._last_render_state = None
+        self._last_drawn_rect = None
+        self._build_state_images()
+
+    @property
+    def display_image(self) -> str:
+        """
+        Gets the image_info key for the current state. The state itself is stored as a ButtonState in self.state, this is kept so the string keys still work.
+
+        Returns:
+            str: "default", "hover", "toggle" or "hover toggle".
+        """
+        return BUTTON_STATE_KEYS[self.state]
+
+    @display_image.setter
+    def display_image(self, value: Union[str, ButtonState]) -> None:
+        """
+        Sets the current state from either an image_info key or a ButtonState.
+
+        Args:
+            value (Union[str, ButtonState]): The new state.
+        """
+        self.state = _KEY_TO_BUTTON_STATE[value] if isinstance(value, str) else ButtonState(value)
+
+    @property
+    def position(self) -> pygame.Vector2:
+        """
+        Gets the position of the button. It's stored as a plain tuple (_position) so the render and mouse code doesn't make a new Vector2 for every bit of math.
+
+        Returns:
+            pygame.Vector2: A copy of the position.
+        """
+        return pygame.Vector2(self._position)
+
+    @position.setter
+    def position(self, value: Union[pygame.Vector2, tuple]) -> None:
+        """
+        Sets the position of the button.
+
+        Args:
+            value (Union[pygame.Vector2, tuple]): The new position.
+        """
+        self._position = (float(value[0]), float(value[1]))
     
-    def render(self, screen: pygame.Surface, bounding_area: Optional[pygame.Rect] = None, position: Optional[Union[pygame.Vector2, tuple]] = None, offset: Optional[Union[pygame.Vector2, tuple]] = (0,0)) -> None:
+    def render(self, screen: pygame.Surface, bounding_area: Optional[pygame.Rect] = None, position: Optional[Union[pygame.Vector2, tuple]] = None, offset: Optional[Union[pygame.Vector2, tuple]] = (0,0), skip_bounds_check: bool = False) -> List[pygame.Rect]:
         """
         Blits the button's current image (as specified by display_image) at the button's position.
 
@@ -58,39 +227,96 @@ class Button:
             screen (pygame.Surface): The screen where the button should be rendered.
             bounding_area (pygame.Rect, optional): The area where the button should be rendered. Defaults to None.
             position (pygame.Vector2, optional): The new position of the button. Defaults to None.
+            skip_bounds_check (bool, optional): Skips the bounding_area check, for callers that already know the button is visible. Defaults to False.
+
+        Returns:
+            List[pygame.Rect]: The areas of the screen that changed since the last render.
 
         Raises:
             KeyError: If Button.display_image and default_dict are not int the image_info dictionary.
         """
-        if position is not None and not isinstance(position,(pygame.Vector2,tuple)):
-            raise TypeError(f"Expected a pygame.Vector2 or a tuple of ints for postion, but got a {type(position)}")
-        elif isinstance(position, tuple) and len(position) != 2:
-            raise ValueError(f"position must contain exactly two values, not {len(position)}")
+        if __debug__:#type checks get stripped out with python -O
+            if position is not None and not isinstance(position,(pygame.Vector2,tuple)):
+                raise TypeError(f"Expected a pygame.Vector2 or a tuple of ints for postion, but got a {type(position)}")
+            elif isinstance(position, tuple) and len(position) != 2:
+                raise ValueError(f"position must contain exactly two values, not {len(position)}")
+            if bounding_area is not None and not isinstance(bounding_area,pygame.Rect):
+                raise TypeError(f"Expected a pygame.Rect for bounding_area, but got {type(bounding_area)}")
         if position is not None:
             self.position = position
-        if bounding_area is not None and not isinstance(bounding_area,pygame.Rect):
-            raise TypeError(f"Expected a pygame.Rect for bounding_area, but got {type(bounding_area)}")
-        if bounding_area is None:
-            bounding_area = pygame.rect.Rect(0, 0, screen.get_width(), screen.get_height())
-        if not self.is_in_area(bounding_area,offset=offset):
-            return
+        if not skip_bounds_check:
+            if bounding_area is None:
+                bounding_area = pygame.rect.Rect(0, 0, screen.get_width(), screen.get_height())
+            if not self.is_in_area(bounding_area,offset=offset):
+                return self.track_dirty_rects(None, None)
+        return self._render_fast(screen, offset[0], offset[1])
+
+    def _render_fast(self, screen: pygame.Surface, offset_x: float, offset_y: float) -> List[pygame.Rect]:
+        """
+        Draws the button with no checks at all, for callers that already validated everything and know the button is visible.
 
-        try:
-            screen.blit(self.image_info[self.display_image][0], self.position + offset)
-        except KeyError:
-            # If the self.display_image is not found in the dictionary, try to blit the default image
-            try:
-                if self.display_image == "hover toggle":
-                    try:
-                        screen.blit(self.image_info["toggle"][0], self.position + offset)
-                        return
-                    except:
-                        pass
-                    #on fail and on "no, this isn't hover toggle" should make this next part happen
-                screen.blit(self.image_info["default"][0], self.position + offset)
-            except KeyError:
-                # If the default image is also not found, raise an error
-                raise KeyError(f"Button.display_image '{self.display_image}' and the default image are both missing in image_info dictionary")
+        Args:
+            screen (pygame.Surface): The screen to draw on.
+            offset_x (float): Added to the button's x position.
+            offset_y (float): Added to the button's y position.
+
+        Returns:
+            List[pygame.Rect]: The areas of the screen that changed since the last render.
+        """
+        image = self.get_display_surface()
+        drawn_rect = screen.blit(image, (self._position[0] + offset_x, self._position[1] + offset_y))
+        return self.track_dirty_rects((image, drawn_rect.topleft), drawn_rect)
+
+    _image_fallbacks = {"hover toggle": "toggle"} #what to try before "default" when a state has no image
+
+    def _build_state_images(self) -> None:
+        """
+        Fills in image_info for every ButtonState that doesn't have an image, using the fallbacks ("hover toggle" -> "toggle" -> "default").
+        The filled in entries are the same tuples as the ones they fall back to, not copies. After that drawing is just a list index.
+        This has to be called again if image_info gets changed after the button is made.
+
+        Raises:
+            KeyError: If the default image is missing from the image_info dictionary.
+        """
+        default_entry = self.image_info.get("default")
+        if default_entry is None:
+            raise KeyError("The default image is missing in image_info dictionary")
+        for key in BUTTON_STATE_KEYS:#"toggle" comes before "hover toggle", so hover toggle falls all the way back to default if both are missing
+            if key not in self.image_info:
+                self.image_info[key] = self.image_info.get(self._image_fallbacks.get(key, "default"), default_entry)
+        self._state_images = [self.image_info[key] for key in BUTTON_STATE_KEYS]
+
+    def get_display_entry(self) -> tuple:
+        """
+        Gets the image_info entry for the current state, falling back to "toggle" for "hover toggle" and then to "default".
+
+        Returns:
+            tuple: The (surface, size, alpha mask) entry to draw.
+        """
+        return self._state_images[self.state]
+
+    def get_display_surface(self) -> pygame.Surface:
+        """
+        Gets the image that should be drawn for the current state, with the same fallbacks as get_display_entry.
+
+        Returns:
+            pygame.Surface: The image to draw.
+        """
+        return self.get_display_entry()[0]
+
+    def get_blit(self, screen: pygame.Surface) -> Optional[Tuple[pygame.Surface, pygame.Vector2]]:
+        """
+        Gets the (image, position) pair that render would blit with no offset, so a Node can draw it as part of one screen.blits call.
+
+        Args:
+            screen (pygame.Surface): The screen the button will be drawn on.
+
+        Returns:
+            Optional[Tuple[pygame.Surface, pygame.Vector2]]: The blit arguments, or None if the button is off screen.
+        """
+        if not self.is_in_area(screen.get_rect()):
+            return None
+        return (self.get_display_surface(), self._position)
 
     def is_mouseover(self, mouse_position: pygame.Vector2, mouseover_image_key: str = "default") -> bool:
         """
@@ -106,14 +332,12 @@ class Button:
         Raises:
             KeyError: if mouseover_image_key is not found in the image_info dictionary
         """
-        ALPHA_THRESHOLD = 125
         try:
-            relative_position = pygame.Vector2(mouse_position) - self.position
-            mouseover_image = self.image_info[mouseover_image_key.lower()][0]
-            if mouseover_image.get_rect().collidepoint(relative_position):
-                color = mouseover_image.get_at((int(relative_position.x),int(relative_position.y)))
-                if color.a > ALPHA_THRESHOLD:
-                    return True
+            mask = self.image_info[mouseover_image_key.lower()][2]
+            relative_x = int(mouse_position[0] - self._position[0])
+            relative_y = int(mouse_position[1] - self._position[1])
+            if 0 <= relative_x < mask.shape[0] and 0 <= relative_y < mask.shape[1]:
+                return bool(mask[relative_x, relative_y])
         except KeyError:
             # Handle the case where the mouseover_image_key is not found
             print(f"Image key '{mouseover_image_key}' not found.")
@@ -139,52 +363,88 @@ class Button:
         if image_type not in self.image_info:
             raise ValueError(f"Unknown image type: {image_type}")
         # Move the image rectangle to the position and get its rectangle
-        image_rect = self.image_info[image_type][0].get_rect().move(self.position+offset)
+        image_rect = self.image_info[image_type][0].get_rect().move(int(self._position[0] + offset[0]), int(self._position[1] + offset[1]))
         # Check if the image rectangle collides with the bounding area
         return bounding_area.colliderect(image_rect)
     
-    def handle_mouse(self, mouse_position: pygame.Vector2, new_pressed_button_state, held_button_state) -> bool:
-        if self.is_mouseover(mouse_position):
-            if self.display_image == "toggle" or self.display_image == "hover toggle":
-                self.display_image = "hover toggle"
+    def handle_mouse(self, mouse: MouseFrame) -> bool:
+        if self.is_mouseover(mouse.pos):
+            if self.state == ButtonState.TOGGLE or self.state == ButtonState.HOVER_TOGGLE:
+                self.state = ButtonState.HOVER_TOGGLE
             else:
-                self.display_image = "hover"
-            if new_pressed_button_state != held_button_state and new_pressed_button_state[0]:#this evaluates to true when you click on this with LMB
+                self.state = ButtonState.HOVER
+            if mouse.changed and mouse.pressed[0]:#this evaluates to true when you click on this with LMB
                 if self.is_toggle:
                     #should be pressed on. If it's toggle, then we toggle it, otherwise we don't
-                    if self.display_image == "hover toggle":
-                        self.display_image = "hover"
+                    if self.state == ButtonState.HOVER_TOGGLE:
+                        self.state = ButtonState.HOVER
                         if self.on_untoggle_call:
                             self.on_untoggle_call()
                     else:
-                        self.display_image = "hover toggle"
+                        self.state = ButtonState.HOVER_TOGGLE
                         if self.on_toggle_call:
                             self.on_toggle_call()
                 else:
                     self.on_toggle_call()
-        elif self.display_image == "hover":
+        elif self.state == ButtonState.HOVER:
             #reset, because if it was hover and we aren't on it anymore it shouldn't be hover
-            self.display_image = "default"
-        elif self.display_image == "hover toggle":
-            self.display_image = "toggle"
+            self.state = ButtonState.DEFAULT
+        elif self.state == ButtonState.HOVER_TOGGLE:
+            self.state = ButtonState.TOGGLE
+
+    def get_mouse_area(self) -> pygame.Rect:
+        """
+        Gets the area of the screen where this button can react to the mouse, so a Node can skip it when the mouse is somewhere else.
 
+        Returns:
+            pygame.Rect: The bounding box of the default image (padded a pixel since the position isn't always a whole number).
+        """
+        width, height = self.image_info["default"][1]
+        return pygame.Rect(int(self._position[0]), int(self._position[1]), width + 1, height + 1)
 
 
 #---------------------------- CHILD OBJECT ----------------------------#
 
+#fonts (pygame.freetype.Font and GlyphAtlas) hash by identity, so they can be part of the cache key as they are
+@lru_cache(maxsize=2048)
+def render_fitted_text(font, text: str, color: tuple, max_width: float) -> Tuple[pygame.Surface, bool]:
+    """
+    Renders text and squashes it horizontally if it's wider than max_width. Results are cached since button text almost never changes.
+
+    Args:
+        font: The font to render with, anything with a pygame.freetype.Font style render(text, color) method.
+        text (str): The text to render.
+        color (tuple): The text color.
+        max_width (float): The widest the text is allowed to be.
+
+    Returns:
+        Tuple[pygame.Surface, bool]: The rendered text, and whether it had to be scaled down.
+    """
+    text_surface, rect = font.render(text, color)
+    rendered_text = text_surface.convert_alpha()
+    if rendered_text.get_width() > max_width:
+        # If the text is wider than the available width, scale it down
+        return pygame.transform.scale(rendered_text, (max_width, rendered_text.get_height())), True
+    return rendered_text, False
+
 class TextButton(Button):
     """
     A button that displays text. images are backgrounds, which should be close to a long rectangle to make sure it fills the shape correctly, the text will be centered within the bounds of the drawn image.
     The default color of the text is (0, 229, 179) because I like that color
     """
-    def __init__(self,default_image, font:pygame.font.Font, text_color = (0, 229, 179), display_text = "Default Text", text_padding = 20, extra_images=None, position = pygame.Vector2()):
+    __slots__ = ("font", "text_color", "display_text", "text_padding", "_composite", "_composite_key")
+
+    def __init__(self, default_image: pygame.Surface, font: pygame.font.Font, text_color: Tuple[int, int, int] = (0, 229, 179), display_text: str = "Default Text", text_padding: int = 20, extra_images: Optional[Dict[str, pygame.Surface]] = None, position: Union[pygame.Vector2, tuple] = pygame.Vector2()) -> None:
         super().__init__(default_image, extra_images=extra_images, position = position)
         self.font = font
         self.text_color = text_color
         self.display_text = display_text
         self.text_padding = text_padding
+        #the background for the current state with the text already drawn on it, rebuilt whenever anything in _composite_key changes
+        self._composite = None
+        self._composite_key = None
     
-    def render(self, screen: pygame.Surface, bounding_area: Optional[pygame.Rect] = None, position: Optional[Union[pygame.Vector2, tuple]] = None, offset: Optional[Union[pygame.Vector2, tuple]] = (0,0)) -> None:
+    def render(self, screen: pygame.Surface, bounding_area: Optional[pygame.Rect] = None, position: Optional[Union[pygame.Vector2, tuple]] = None, offset: Optional[Union[pygame.Vector2, tuple]] = (0,0), skip_bounds_check: bool = False) -> List[pygame.Rect]:
         """
         Blits the button's background image (as specified by display_image) at the button's position, and then renders the text on top of it.
 
@@ -198,48 +458,234 @@ class TextButton(Button):
             bounding_area (pygame.Rect, optional): The area where the button should be rendered. Defaults to None.
             display_image (str, optional): The type of image to be rendered. Defaults to "default".
             position (pygame.Vector2, optional): The new position of the button. Defaults to None.
+            skip_bounds_check (bool, optional): Skips the bounding_area check, for callers that already know the button is visible. Defaults to False.
+
+        Returns:
+            List[pygame.Rect]: The areas of the screen that changed since the last render.
 
         Raises:
             ValueError: If display_image is not a string, or if display_image does not exist in the image_info dictionary.
             KeyError: If display_image and default_dict are not int the image_info dictionary.
         """
-        if position is not None and not isinstance(position,(pygame.Vector2,tuple)):
-            raise TypeError(f"Expected a pygame.Vector2 or a tuple of ints for postion, but got a {type(position)}")
-        elif isinstance(position, tuple) and len(position) != 2:
-            raise ValueError(f"position must contain exactly two values, not {len(position)}")
+        if __debug__:#type checks get stripped out with python -O
+            if position is not None and not isinstance(position,(pygame.Vector2,tuple)):
+                raise TypeError(f"Expected a pygame.Vector2 or a tuple of ints for postion, but got a {type(position)}")
+            elif isinstance(position, tuple) and len(position) != 2:
+                raise ValueError(f"position must contain exactly two values, not {len(position)}")
+            if bounding_area is not None and not isinstance(bounding_area,pygame.Rect):
+                raise TypeError(f"Expected a pygame.Rect for bounding_area, but got {type(bounding_area)}")
         if position is not None:
             self.position = position
-        if bounding_area is not None and not isinstance(bounding_area,pygame.Rect):
-            raise TypeError(f"Expected a pygame.Rect for bounding_area, but got {type(bounding_area)}")
-        if bounding_area is None:
-            bounding_area = pygame.rect.Rect(0, 0, screen.get_width(), screen.get_height())
-        if not self.is_in_area(bounding_area,offset=offset):
-            return
-        try:
-            display_image = self.image_info[self.display_image]
-        except KeyError:
-            try:
-                display_image = self.image_info["default"]
-            except KeyError:
-                raise KeyError(f"Button.display_image '{display_image}' and the default image are both missing in image_info dictionary")
-        
-        text_surface, rect = self.font.render(str(self.display_text),self.text_color)
-        rendered_text = text_surface.convert_alpha()
+        if not skip_bounds_check:
+            if bounding_area is None:
+                bounding_area = pygame.rect.Rect(0, 0, screen.get_width(), screen.get_height())
+            if not self.is_in_area(bounding_area,offset=offset):
+                return self.track_dirty_rects(None, None)
+        return self._render_fast(screen, offset[0], offset[1])
+
+    def get_display_surface(self) -> pygame.Surface:
+        """
+        Gets the background for the current state with the text already drawn on it, so drawing the button is a single blit.
+        It only gets rebuilt when the state, text, color, padding or font changes.
+
+        Returns:
+            pygame.Surface: The image to draw.
+        """
+        display_image = self.get_display_entry()
+        composite_key = (display_image[0], self.display_text, self.text_color, self.text_padding, self.font)
+        if composite_key != self._composite_key:
+            self._composite = self.build_composite(display_image)
+            self._composite_key = composite_key
+        return self._composite
+
+    def build_composite(self, display_image: tuple) -> pygame.Surface:
+        """
+        Draws the text centered on a copy of a background image.
+
+        Args:
+            display_image (tuple): The image_info entry to use as the background.
+
+        Returns:
+            pygame.Surface: The background with the text on it.
+        """
         available_width = display_image[1][0] - self.text_padding
-        
-        text_offset = pygame.Vector2()
+        if isinstance(self.font, GlyphAtlas):
+            layout = self.font.layout(str(self.display_text), self.text_color)
+            if layout is not None and layout[1] <= available_width:
+                #the glyphs go straight from the atlas onto the background, no string surface in between
+                #(text that needs squashing or has characters that aren't baked still goes through render_fitted_text below)
+                glyph_blits, text_width, text_height = layout
+                text_x = (available_width - text_width) / 2
+                text_y = (display_image[1][1] - text_height) / 2 # centered on the visible glyphs, same as the render_fitted_text path
+                composite = display_image[0].copy()
+                composite.blits([(atlas, (x + text_x, y + text_y), area) for atlas, (x, y), area, special_flags in glyph_blits], doreturn=False)
+                return composite
+        rendered_text, was_scaled = render_fitted_text(self.font, str(self.display_text), tuple(self.text_color), available_width)
+        text_x = (available_width - rendered_text.get_width()) / 2  # Maximum width will be text_padding/2
+        text_y = (display_image[1][1] - rendered_text.get_height()) / 2
+        if was_scaled:
+            text_x += self.text_padding/2
+        composite = display_image[0].copy()
+        composite.blit(rendered_text, (text_x, text_y))
+        return composite
+
+    def release_composite(self) -> None:
+        """
+        Drops the composite surface to free its memory, for buttons that aren't on screen. It gets rebuilt the next time it's drawn.
+        """
+        self._composite = None
+        self._composite_key = None
 
-        if rendered_text.get_width() > available_width:
-            # If the text is wider than the available width, scale it down
-            rendered_text = pygame.transform.scale(rendered_text, (available_width, rendered_text.get_height()))
-            text_offset += pygame.Vector2(self.text_padding/2,0)
-        
-        width_difference = available_width - rendered_text.get_width()
-        height_difference = display_image[1][1] - rendered_text.get_height()
-        text_offset += pygame.Vector2(width_difference, height_difference) / 2  # Maximum width will be text_padding/2
+    def get_blits(self, offset: Union[pygame.Vector2, tuple] = (0,0)) -> List[Tuple[pygame.Surface, Tuple[float, float]]]:
+        """
+        Gets the (surface, position) pairs needed to draw the button, so a ButtonList can draw lots of buttons in one blits call.
+
+        Args:
+            offset (Union[pygame.Vector2, tuple], optional): Added to the button's position. Defaults to (0,0).
 
-        screen.blit(display_image[0], self.position + offset)
-        screen.blit(rendered_text, self.position + text_offset + offset)
+        Returns:
+            List[Tuple[pygame.Surface, Tuple[float, float]]]: The composite blit.
+        """
+        return [(self.get_display_surface(), (self._position[0] + offset[0], self._position[1] + offset[1]))]
+
+
+#--------------------------------------------------------------------#
+#---------------------------- NEW OBJECT ----------------------------#
+#--------------------------------------------------------------------#
+
+
+class GlyphAtlas:
+    """
+    Wraps a pygame.freetype.Font and bakes its glyphs into one surface per text color, so strings get built by blitting pieces of that surface instead of going through FreeType every time.
+    It has the same render(text, fgcolor) -> (Surface, Rect) call as the font, so it can be passed anywhere a font is expected.
+    Strings with characters that aren't baked (like japanese text) get rendered by the font itself. Finished strings are cached either way.
+    """
+    def __init__(self, font, characters: Optional[str] = None, cache_size: int = 512) -> None:
+        """
+        Initializes a GlyphAtlas. Nothing gets baked until a color is first used.
+
+        Args:
+            font (pygame.freetype.Font): The font to bake.
+            characters (str, optional): The characters to bake. Defaults to the printable characters from 32 to 255.
+            cache_size (int, optional): How many finished strings to keep around. Defaults to 512.
+        """
+        self.font = font
+        if characters is None:
+            characters = "".join(chr(code) for code in range(32, 256) if chr(code).isprintable())
+        self.characters = characters
+        self.ascender = font.get_sized_ascender()
+        self.line_height = font.get_sized_ascender() - font.get_sized_descender()
+        self.atlases = {}
+        self.string_cache = OrderedDict()
+        self.cache_size = cache_size
+
+    def bake(self, color) -> Tuple[pygame.Surface, Dict[str, tuple]]:
+        """
+        Renders every character into one strip and remembers where each one is.
+
+        Args:
+            color (tuple): The text color.
+
+        Returns:
+            Tuple[pygame.Surface, Dict[str, tuple]]: The atlas surface and a dictionary of character -> (area in the atlas, bearing, horizontal advance).
+            Each glyph is cropped to its visible pixels (the bearing is adjusted to match), so blank ones like space have an empty area.
+        """
+        rendered_glyphs = []
+        for character, metrics in zip(self.characters, self.font.get_metrics(self.characters)):
+            if metrics is None:
+                continue  # The font doesn't have this character
+            surface, rect = self.font.render(character, color)
+            visible = surface.get_bounding_rect()
+            surface = surface.subsurface(visible) if visible.width and visible.height else None
+            rendered_glyphs.append((character, surface, (rect.x + visible.x, rect.y - visible.y), metrics[4]))
+
+        visible_surfaces = [surface for _, surface, _, _ in rendered_glyphs if surface is not None]
+        atlas_width = sum(surface.get_width() for surface in visible_surfaces)
+        atlas_height = max((surface.get_height() for surface in visible_surfaces), default=1)
+        atlas = pygame.Surface((max(atlas_width, 1), max(atlas_height, 1)), pygame.SRCALPHA)
+        atlas.fill((0, 0, 0, 0))
+        glyphs = {}
+        x = 0
+        for character, surface, bearing, advance in rendered_glyphs:
+            if surface is None:
+                glyphs[character] = (pygame.Rect(x, 0, 0, 0), bearing, advance)
+                continue
+            #RGBA_MAX onto a fully transparent surface copies the glyph as it is instead of blending its alpha in
+            area = atlas.blit(surface, (x, 0), special_flags=pygame.BLEND_RGBA_MAX)
+            glyphs[character] = (area, bearing, advance)
+            x += surface.get_width()
+        return atlas, glyphs
+
+    def layout(self, text: str, color) -> Optional[Tuple[list, int, int]]:
+        """
+        Works out where every character of text goes. Positions are relative to the top of the visible glyphs, like the tight box font.render gives back.
+
+        Args:
+            text (str): The text to lay out.
+            color (tuple): The text color.
+
+        Returns:
+            Optional[Tuple[list, int, int]]: A list of (atlas, position, area, special_flags) blits, the total width and the height, or None if a character isn't in the atlas.
+        """
+        color = tuple(color)
+        if color not in self.atlases:
+            self.atlases[color] = self.bake(color)
+        atlas, glyphs = self.atlases[color]
+        blits = []
+        pen_x = 0.0
+        width = 0
+        top = None
+        bottom = 0
+        for character in text:
+            glyph = glyphs.get(character)
+            if glyph is None:
+                return None
+            area, (bearing_x, bearing_y), advance = glyph
+            x = max(round(pen_x) + bearing_x, 0)
+            pen_x += advance
+            width = max(width, x + area.width, round(pen_x))
+            if not area:
+                continue  # Nothing to draw, like a space
+            y = self.ascender - bearing_y
+            top = y if top is None else min(top, y)
+            bottom = max(bottom, y + area.height)
+            blits.append((atlas, (x, y), area, pygame.BLEND_RGBA_MAX))
+        if top is None:
+            return blits, width, 0
+        blits = [(atlas, (x, y - top), area, special_flags) for atlas, (x, y), area, special_flags in blits]
+        return blits, width, bottom - top
+
+    def render(self, text: str, fgcolor) -> Tuple[pygame.Surface, pygame.Rect]:
+        """
+        Renders text the same way pygame.freetype.Font.render does, using the atlas when possible.
+
+        Args:
+            text (str): The text to render.
+            fgcolor (tuple): The text color.
+
+        Returns:
+            Tuple[pygame.Surface, pygame.Rect]: The rendered text and its rect.
+        """
+        key = (text, tuple(fgcolor))
+        rendered = self.string_cache.get(key)
+        if rendered is not None:
+            self.string_cache.move_to_end(key)
+            return rendered
+
+        layout = self.layout(text, fgcolor)
+        if layout is None:
+            rendered = self.font.render(text, fgcolor)
+        else:
+            blits, width, height = layout
+            surface = pygame.Surface((max(width, 1), max(height, 1)), pygame.SRCALPHA)
+            surface.fill((0, 0, 0, 0))
+            surface.blits(blits, doreturn=False)
+            rendered = (surface, surface.get_rect())
+
+        self.string_cache[key] = rendered
+        if len(self.string_cache) > self.cache_size:
+            self.string_cache.popitem(last=False)
+        return rendered
 
 
 #--------------------------------------------------------------------#
@@ -266,9 +712,9 @@ class ButtonList:
         """
         if position is not None and not isinstance(position, (pygame.Vector2, tuple)):
             raise ValueError("position must be a pygame.Vector2, tuple or None.")
-        self.position = pygame.Vector2(0, 0)
+        self.position = (0, 0)
         if position is not None:
-            self.position = pygame.Vector2(position)
+            self.position = position
 
         self.button_dict = {}
         self.sorted_keys = []
@@ -281,8 +727,41 @@ class ButtonList:
         self.scroll_sensitivity = scroll_sensitivity #This is used to say how much a scroll up/down should affect this. Technically, isn't required because you can just do it externally, but it's nice to have here
         self.on_button_toggle = None
         self.on_button_untoggle = None
+        self.removed_button_rects = [] #buttons that got deleted still need their old spot cleared off the display
+        #filled in by calculate_button_positions, the buttons in sorted order and where each one starts/ends vertically, so render can find the visible ones with a binary search
+        self._ordered_buttons = []
+        self._heights = np.zeros(0, dtype=np.int32)
+        self._cum_heights = np.zeros(0, dtype=np.int32) #bottom of each button, the last entry is the height of the whole list
+        self._tops = np.zeros(0, dtype=np.int32)
+        self._lefts = np.zeros(0, dtype=np.int32) #together with _tops/_cum_heights these are every button's bounding box, for hit-testing all of them at once
+        self._rights = np.zeros(0, dtype=np.int32)
+        self._hovered_button = None #the only button that can be showing its hover image
+        self._last_input_key = None #the mouse/scroll state handle_mouse last ran with, set back to None whenever the buttons change so the next call can't be skipped
+        self._last_offset = None #where the list was drawn from last render, if that changes (scrolling) the whole list area is dirty
+        self._button_index = {} #button -> its index in _ordered_buttons/sorted_keys, so finding a button's organizer doesn't mean scanning button_dict
+        self._visible_buttons = [] #the buttons drawn last render, so the ones that scroll out of view can report their old spot
+
+    @property
+    def position(self) -> pygame.Vector2:
+        """
+        Gets the position of the ButtonList. Stored as a plain tuple (_position), same as Button.
+
+        Returns:
+            pygame.Vector2: A copy of the position.
+        """
+        return pygame.Vector2(self._position)
+
+    @position.setter
+    def position(self, value: Union[pygame.Vector2, tuple]) -> None:
+        """
+        Sets the position of the ButtonList.
+
+        Args:
+            value (Union[pygame.Vector2, tuple]): The new position.
+        """
+        self._position = (float(value[0]), float(value[1]))
     
-    def render(self, screen: pygame.Surface, bounding_area: Optional[pygame.Rect] = None, position: Optional[Union[pygame.Vector2, tuple]] = None) -> None:
+    def render(self, screen: pygame.Surface, bounding_area: Optional[pygame.Rect] = None, position: Optional[Union[pygame.Vector2, tuple]] = None) -> List[pygame.Rect]:
         """
         Renders all the buttons in a vertical list.
 
@@ -292,14 +771,46 @@ class ButtonList:
             position (Optional[Union[pygame.Vector2, tuple]], optional): The position of the ButtonList. Defaults to None.
 
         Returns:
-            None: None
+            List[pygame.Rect]: The areas of the screen that changed since the last render.
         """
         if bounding_area is None:
             bounding_area = pygame.rect.Rect(0, 0, screen.get_width(), screen.get_height())
         
-        for key in self.sorted_keys:
-            button = self.button_dict[key]
-            button.render(screen, bounding_area=bounding_area, offset=self.position-pygame.Vector2(0,self.scroll_position))
+        offset = (self._position[0], self._position[1] - self.scroll_position)
+        #buttons are stacked vertically in sorted order, so the visible ones are one contiguous slice
+        first_visible = int(np.searchsorted(self._cum_heights, bounding_area.top - offset[1], side="right"))
+        last_visible = int(np.searchsorted(self._tops, bounding_area.bottom - offset[1], side="left"))
+        visible_buttons = self._ordered_buttons[first_visible:last_visible]
+
+        dirty_rects = []
+        blit_sequence = []
+        for button in visible_buttons:
+            button_blits = button.get_blits(offset)
+            blit_sequence += button_blits
+            background, background_position = button_blits[0]
+            drawn_rect = pygame.Rect(int(background_position[0]), int(background_position[1]), *background.get_size())
+            dirty_rects += button.track_dirty_rects((background, drawn_rect.topleft, button.display_text, button.text_color), drawn_rect)
+        if hasattr(screen, "fblits"):#pygame-ce only
+            screen.fblits(blit_sequence)
+        else:
+            screen.blits(blit_sequence, doreturn=False)
+
+        for button in self._visible_buttons:
+            if button not in visible_buttons:
+                if button._last_drawn_rect is not None:
+                    dirty_rects += button.track_dirty_rects(None, None)
+                button.release_composite() #only the visible buttons keep one, so long playlists don't hold a surface per entry
+        self._visible_buttons = visible_buttons
+        dirty_rects += self.removed_button_rects
+        self.removed_button_rects = []
+
+        if offset != self._last_offset and len(self._rights) > 0:
+            #everything moved, so one rect covering the list is a lot less for display.update to deal with than two rects per visible button
+            list_width = int(self._rights.max())
+            list_area = pygame.Rect(int(self._position[0]), int(self._position[1]), list_width, bounding_area.bottom - int(self._position[1]))
+            dirty_rects = [list_area.clip(bounding_area)] + [rect for rect in dirty_rects if not list_area.contains(rect)]
+        self._last_offset = offset
+        return dirty_rects
     
     def update_buttons(self, button_dict: Dict[str, str], default_image, font: pygame.font.Font, text_color=(0, 229, 179), text_padding=20, extra_images: Optional[Dict[str, pygame.Surface]]=None) -> None:
         """
@@ -333,13 +844,19 @@ class ButtonList:
         Returns:
             None: None
         """
-        button_height = 0
-        for key in self.sorted_keys:
-            button = self.button_dict[key]
-            button.position = pygame.Vector2(0,button_height)
-            button_height += button.image_info["default"][1][1]#height can change depending on displayed image
+        self._ordered_buttons = [self.button_dict[key] for key in self.sorted_keys]
+        self._last_input_key = None
+        self._button_index = {button: index for index, button in enumerate(self._ordered_buttons)}
+        self._heights = np.fromiter((button.image_info["default"][1][1] for button in self._ordered_buttons), dtype=np.int32, count=len(self._ordered_buttons))
+        self._cum_heights = np.cumsum(self._heights, dtype=np.int32)
+        self._tops = self._cum_heights - self._heights
+        self._lefts = np.zeros(len(self._ordered_buttons), dtype=np.int32)
+        self._rights = self._lefts + np.fromiter((button.image_info["default"][1][0] for button in self._ordered_buttons), dtype=np.int32, count=len(self._ordered_buttons))
+        #the tops are already plain floats from the cumsum, so they go straight into _position without the setter's conversion
+        for button, top in zip(self._ordered_buttons, self._tops.astype(np.float64).tolist()):
+            button._position = (0.0, top)
     
-    def get_max_scroll(self, bounding_height) -> int:
+    def get_max_scroll(self, bounding_height: int) -> int:
         """
         Calculates the maximum scroll amount based on the total height of all buttons and the height of the bounding area.
 
@@ -349,120 +866,138 @@ class ButtonList:
         Returns:
             int: The maximum scroll amount.
         """
-        button_height = 0
-        for button in self.button_dict.values():
-            button_height += button.image_info[button.display_image][1][1]  # height can change depending on displayed image
-        return max(0, button_height - bounding_height)
+        if len(self._cum_heights) == 0:
+            return 0
+        return max(0, int(self._cum_heights[-1]) - bounding_height)
     
-    def handle_exclusive_toggle_mouse(self, mouse_position, click_state, mouse_button):
-        relative_mouse_position = mouse_position-self.position
+    def handle_exclusive_toggle_mouse(self, mouse_position: Tuple[float, float], click_state: bool, mouse_button: Optional[int]) -> None:
+        relative_x = mouse_position[0] - self._position[0]
+        relative_y = mouse_position[1] - self._position[1]
         is_in_bounds = True
-        if relative_mouse_position[1] < 0:
+        if relative_y < 0:
             is_in_bounds = False
-        relative_mouse_position += pygame.Vector2(0,self.scroll_position)
+        relative_mouse_position = (relative_x, relative_y + self.scroll_position)
+
+        #bounding box test on every button at once, then the exact alpha check only on what's left (at most one button, since they don't overlap)
+        button = None
+        organizer = None
+        if is_in_bounds:
+            mouse_x, mouse_y = relative_mouse_position
+            candidates = np.flatnonzero((self._lefts <= mouse_x) & (mouse_x < self._rights) & (self._tops <= mouse_y) & (mouse_y < self._cum_heights))
+            for index in candidates.tolist():
+                if self._ordered_buttons[index].is_mouseover(relative_mouse_position):
+                    button = self._ordered_buttons[index]
+                    organizer = self.sorted_keys[index]
+                    break
+
+        if self._hovered_button is not None and self._hovered_button is not button and self._hovered_button.state != ButtonState.TOGGLE:
+            self._hovered_button.state = ButtonState.DEFAULT
+        self._hovered_button = button
+
         buttons_to_remove = []
-        for organizer, button in self.button_dict.items():
-            if button.is_mouseover(relative_mouse_position) and is_in_bounds:
-                if click_state and mouse_button == 1:  # Left mouse button
-                    if button.display_image == "hover":
-                        button.display_image = "toggle"
-                        self.toggled_buttons.add(button)
-                        if self.on_button_toggle:
-                            self.on_button_toggle(organizer)
-                    elif button.display_image == "toggle":
-                        button.display_image = "hover"
-                        self.toggled_buttons.remove(button)
-                        if self.on_button_untoggle:
-                            self.on_button_untoggle(organizer)
-                    for b in self.toggled_buttons:
-                        if b != button:
-                            b.display_image = "default"
-                elif click_state and mouse_button == 3:  # Right mouse button
-                    buttons_to_remove.append(organizer)
-                else:
-                    if button.display_image != "toggle":
-                        button.display_image = "hover"
+        if button is not None:
+            if click_state and mouse_button == 1:  # Left mouse button
+                if button.state == ButtonState.HOVER:
+                    button.state = ButtonState.TOGGLE
+                    self.toggled_buttons.add(button)
+                    if self.on_button_toggle:
+                        self.on_button_toggle(organizer)
+                elif button.state == ButtonState.TOGGLE:
+                    button.state = ButtonState.HOVER
+                    self.toggled_buttons.remove(button)
+                    if self.on_button_untoggle:
+                        self.on_button_untoggle(organizer)
+                for b in self.toggled_buttons:
+                    if b != button:
+                        b.state = ButtonState.DEFAULT
+                self.toggled_buttons &= {button}
+            elif click_state and mouse_button == 3:  # Right mouse button
+                buttons_to_remove.append(organizer)
+                self._hovered_button = None
             else:
-                if button.display_image != "toggle":
-                    button.display_image = "default"
+                if button.state != ButtonState.TOGGLE:
+                    button.state = ButtonState.HOVER
         for organizer in buttons_to_remove:
+            removed_rect = self.button_dict[organizer].track_dirty_rects(None, None)
+            self.removed_button_rects += removed_rect
             del self.button_dict[organizer]
-        self.sorted_keys = sorted(self.button_dict.keys())
-        self.calculate_button_positions()
+        if buttons_to_remove:#the order and positions only change when something gets removed
+            self.sorted_keys = sorted(self.button_dict.keys())
+            self.calculate_button_positions()
     
-    def handle_multi_toggle_mouse(self,mouse_position,click_state):
+    def handle_multi_toggle_mouse(self, mouse_position: Tuple[float, float], click_state: bool) -> None:
         """
         NOT YET IMPLIMENTED, also not important yet
         """
         pass
     
-    def random_toggle(self):
-        # Get a list of all buttons
-        buttons = list(self.button_dict.values())
-        
-        # Filter out buttons that are already toggled
-        untoggled_buttons = [button for button in buttons if button.display_image != "toggle"]
+    def random_toggle(self) -> None:
+        self._last_input_key = None
+        # Every button that isn't already toggled, _button_index's keys are all the current buttons
+        untoggled_buttons = self._button_index.keys() - self.toggled_buttons
         
         # If there are untoggled buttons, select one at random and toggle it
         if untoggled_buttons:
-            random_button = random.choice(untoggled_buttons)
-            random_button.display_image = "toggle"
+            random_button = random.choice(tuple(untoggled_buttons))
+
+            # Set the previously toggled buttons back to default, they're the only ones that can be on
+            for button in self.toggled_buttons:
+                button.state = ButtonState.DEFAULT
+                if self.on_button_untoggle and button in self._button_index:
+                    self.on_button_untoggle(self.sorted_keys[self._button_index[button]])
+            self.toggled_buttons.clear()
+
+            random_button.state = ButtonState.TOGGLE
             self.toggled_buttons.add(random_button)
             if self.on_button_toggle:
-                for organizer, button in self.button_dict.items():
-                    if button == random_button:
-                        self.on_button_toggle(organizer)
-                        break
-                
-            # Set all other buttons back to default
-            for button in buttons:
-                if button != random_button:
-                    button.display_image = "default"
-                    for organizer, b in self.button_dict.items():
-                        if b == button:
-                            if self.on_button_untoggle:
-                                self.on_button_untoggle(organizer)
+                self.on_button_toggle(self.sorted_keys[self._button_index[random_button]])
                     
-    def sequential_toggle(self):
-        # Get a list of all buttons in sorted order
-        sorted_buttons = [(self.button_dict[key], key) for key in self.sorted_keys]
-        
-        # Find the currently toggled button
-        toggled_button = next(((button, organizer) for button, organizer in sorted_buttons if button.display_image == "toggle"), None)
+    def sequential_toggle(self) -> None:
+        self._last_input_key = None
+        if not self._ordered_buttons:
+            return
+        # Find the currently toggled button, only toggled_buttons has to be checked for that
+        toggled_indices = [self._button_index[button] for button in self.toggled_buttons if button.state == ButtonState.TOGGLE and button in self._button_index]
         
         # If there is a toggled button, toggle the next one
-        if toggled_button:
-            index = sorted_buttons.index(toggled_button)
-            next_index = (index + 1) % len(sorted_buttons)
-            next_button, next_organizer = sorted_buttons[next_index]
-            toggled_button[0].display_image = "default"
+        if toggled_indices:
+            index = min(toggled_indices)
+            toggled_button = self._ordered_buttons[index]
+            next_index = (index + 1) % len(self._ordered_buttons)
+            next_button = self._ordered_buttons[next_index]
+            toggled_button.state = ButtonState.DEFAULT
             if self.on_button_untoggle:
-                self.on_button_untoggle(toggled_button[1])
-            next_button.display_image = "toggle"
+                self.on_button_untoggle(self.sorted_keys[index])
+            next_button.state = ButtonState.TOGGLE
             self.toggled_buttons.clear()
             self.toggled_buttons.add(next_button)
             if self.on_button_toggle:
-                self.on_button_toggle(next_organizer)
+                self.on_button_toggle(self.sorted_keys[next_index])
         else:
             # If there is no toggled button, toggle the first one
-            first_button, first_organizer = sorted_buttons[0]
-            first_button.display_image = "toggle"
+            first_button = self._ordered_buttons[0]
+            first_button.state = ButtonState.TOGGLE
             self.toggled_buttons.add(first_button)
             if self.on_button_toggle:
-                self.on_button_toggle(first_organizer)
+                self.on_button_toggle(self.sorted_keys[0])
         
-    def handle_mouse(self, mouse_position: pygame.Vector2, new_pressed_button_state, held_button_state) -> bool:
-        click_state = new_pressed_button_state != held_button_state and any(new_pressed_button_state)
+    def handle_mouse(self, mouse: MouseFrame) -> bool:
+        #a mouse that hasn't moved or clicked over a list that hasn't scrolled or changed can't change anything
+        input_key = (mouse.pos[0], mouse.pos[1], tuple(mouse.pressed), tuple(mouse.prev_pressed), self.scroll_position)
+        if input_key == self._last_input_key:
+            return False
+        self._last_input_key = input_key
+        click_state = mouse.changed != 0 and any(mouse.pressed)
         mouse_button = None
-        for i, state in enumerate(new_pressed_button_state):
-            if state and not held_button_state[i]:
+        for i, state in enumerate(mouse.pressed):
+            if state and not mouse.prev_pressed[i]:
                 mouse_button = i + 1
                 break
         if self.is_exclusive:
-            self.handle_exclusive_toggle_mouse(mouse_position, click_state, mouse_button)
+            self.handle_exclusive_toggle_mouse(mouse.pos, click_state, mouse_button)
         else:
             #This will break right now, unless I got lazy and just never removed this
-            self.handle_multi_toggle_mouse(mouse_position,click_state)
+            self.handle_multi_toggle_mouse(mouse.pos,click_state)
 
 
 #--------------------------------------------------------------------#
@@ -470,7 +1005,7 @@ class ButtonList:
 #--------------------------------------------------------------------#
 
 
-class ProgressBar:
+class ProgressBar(DirtyRectTracker):
     """
     A progress bar widget.
 
@@ -483,6 +1018,8 @@ class ProgressBar:
     - on_progress_click (Callable[[float], None]): A callback function to be called when the progress bar is clicked.
     """
 
+    __slots__ = ("thickness", "hover_thickness", "length", "_position", "_progress", "is_hovered", "drag_tolerance", "vert_drag_tolerance", "on_progress_click", "_bar_state", "_bar_rect", "_last_render_state", "_last_drawn_rect")
+
     def __init__(self, thickness: int, length: int, hover_thickness: Optional[int] = None, position: Union[pygame.Vector2, tuple] = pygame.Vector2(), drag_tolerance: int = 5, vert_drag_tolerance=0) -> None:
         """
         Initializes a new progress bar.
@@ -506,6 +1043,10 @@ class ProgressBar:
         self.drag_tolerance = drag_tolerance
         self.vert_drag_tolerance = vert_drag_tolerance
         self.on_progress_click: Callable[[float], None] = None
+        self._bar_state = None #(progress, hovered, position) that _bar_rect was built for
+        self._bar_rect = None
+        self._last_render_state = None
+        self._last_drawn_rect = None
 
     def render(self, screen, progress_percentage: Optional[float] = None, color: tuple = (0, 229, 179), position: Optional[Union[pygame.Vector2, tuple]] = None, offset: Optional[Union[pygame.Vector2, tuple]] = None):
         """
@@ -517,40 +1058,76 @@ class ProgressBar:
         - color (tuple, optional): The color of the progress bar. Defaults to (0, 229, 179).
         - position (pygame.Vector2 or tuple, optional): The position of the progress bar. Defaults to None.
         - offset (pygame.Vector2 or tuple, optional): The offset of the progress bar. Defaults to None.
+
+        Returns:
+        - List[pygame.Rect]: The areas of the screen that changed since the last render.
         """
         if progress_percentage is not None and isinstance(progress_percentage, float):
             self.progress = progress_percentage
         
-        bar_rect = pygame.Rect(self.position, (self.length * self.progress, self.thickness))
-        if self.is_hovered:
-            bar_rect = pygame.Rect(self.position, (self.length * self.progress, self.hover_thickness))
-        pygame.draw.rect(screen, color, bar_rect)
-
-    def handle_mouse(self, mouse_position: pygame.Vector2, new_pressed_button_state, held_button_state) -> bool:
+        bar_state = (self._progress, self.is_hovered, self._position)
+        if bar_state != self._bar_state:
+            thickness = self.hover_thickness if self.is_hovered else self.thickness
+            self._bar_rect = pygame.Rect(self._position, (self.length * self._progress, thickness))
+            self._bar_state = bar_state
+        #the back buffer gets cleared every frame, so the bar still has to be drawn, but the dirty rects only change with the state
+        drawn_rect = pygame.draw.rect(screen, color, self._bar_rect)
+        return self.track_dirty_rects((bar_state, color), drawn_rect)
+
+    def handle_mouse(self, mouse: MouseFrame) -> bool:
         """
         Handles mouse events.
 
         Args:
-        - mouse_position (pygame.Vector2): The position of the mouse.
-        - new_pressed_button_state: The state of the mouse buttons this frame.
-        - held_button_state: The state of the mouse buttons the previous frame.
+        - mouse (MouseFrame): The state of the mouse this frame.
 
         Returns:
         - bool: Whether the mouse is hovering over the progress bar.
         """
-        relative_mouse_position = pygame.Vector2(mouse_position) - pygame.Vector2(self.position)
+        relative_x = mouse.pos[0] - self._position[0]
+        relative_y = mouse.pos[1] - self._position[1]
         
         # Check if mouse is within the tolerance of the progress bar
-        if (-self.drag_tolerance <= relative_mouse_position.x <= self.length + self.drag_tolerance and -self.vert_drag_tolerance <= relative_mouse_position.y <= self.hover_thickness+self.vert_drag_tolerance):
+        if (-self.drag_tolerance <= relative_x <= self.length + self.drag_tolerance and -self.vert_drag_tolerance <= relative_y <= self.hover_thickness+self.vert_drag_tolerance):
             self.is_hovered = True
-            if held_button_state[0]:
-                self.progress = min(max(relative_mouse_position[0]/self.length, 0), 1)  # Ensure progress is between 0 and 1
+            if mouse.prev_pressed[0]:
+                self.progress = min(max(relative_x/self.length, 0), 1)  # Ensure progress is between 0 and 1
                 if self.on_progress_click is not None:
                     self.on_progress_click(self.progress)
         else:
             self.is_hovered = False
         return self.is_hovered
+
+    def get_mouse_area(self) -> pygame.Rect:
+        """
+        Gets the area of the screen where the progress bar can react to the mouse, drag tolerances included.
+
+        Returns:
+        - pygame.Rect: The area.
+        """
+        return pygame.Rect(int(self._position[0] - self.drag_tolerance), int(self._position[1] - self.vert_drag_tolerance),
+                           int(self.length + 2*self.drag_tolerance) + 2, int(self.hover_thickness + 2*self.vert_drag_tolerance) + 2)
     
+    @property
+    def position(self) -> pygame.Vector2:
+        """
+        Gets the position of the progress bar, stored internally as a plain tuple (_position).
+
+        Returns:
+        - pygame.Vector2: A copy of the position.
+        """
+        return pygame.Vector2(self._position)
+
+    @position.setter
+    def position(self, value: Union[pygame.Vector2, tuple]) -> None:
+        """
+        Sets the position of the progress bar.
+
+        Args:
+        - value (pygame.Vector2 or tuple): The new position.
+        """
+        self._position = (float(value[0]), float(value[1]))
+
     @property
     def progress(self) -> float:
         """
@@ -577,7 +1154,7 @@ class ProgressBar:
 #--------------------------------------------------------------------#
 
 
-class TextInput:
+class TextInput(DirtyRectTracker):
     """
     A text input widget.
 
@@ -607,11 +1184,22 @@ class TextInput:
         self.background_image = background_image
         self.edge_padding = edge_padding
         self.text_color = text_color
+        #typing appends to / pops off a list of characters, text only gets joined back together when someone asks for it
+        self._chars = []
+        self._text = ""
         self.text = "debug text"
         self.is_focused = False
         self.on_text_change: Callable[[str], None] = None
         self.on_paste: Callable[[str], None] = None
         self.on_enter: Callable[[str], None] = None
+        #(text, color) -> rendered (and squashed if needed) text surface, oldest entries get dropped first
+        #the text is part of the key so nothing has to be invalidated when it changes, and the caret version is just another entry
+        self._render_cache = OrderedDict()
+        self.render_cache_size = 128
+        #the background with the text (and caret) already drawn on it, so a frame where nothing changed is just one blit
+        #rebuilt whenever anything in _composite_key changes
+        self._composite = None
+        self._composite_key = None
 
         # Calculate the width and height based on the background image
         if not isinstance(self.background_image, pygame.Surface):
@@ -619,76 +1207,157 @@ class TextInput:
         self.width = self.background_image.get_width()
         self.height = self.background_image.get_height()
 
+    @property
+    def text(self) -> str:
+        """
+        Gets the text. It's stored as a list of characters, so this joins them and caches the result until the next edit.
+
+        Returns:
+        - str: The text.
+        """
+        if self._text is None:
+            self._text = "".join(self._chars)
+        return self._text
+
+    @text.setter
+    def text(self, value: str) -> None:
+        """
+        Replaces the whole text.
+
+        Args:
+        - value (str): The new text.
+        """
+        self._chars = list(value)
+        self._text = value
+
+    def append_text(self, characters: str) -> None:
+        """
+        Adds characters to the end of the text without rebuilding the whole string.
+
+        Args:
+        - characters (str): The characters to add.
+        """
+        self._chars.extend(characters)
+        self._text = None
+
+    def remove_last_character(self) -> None:
+        """
+        Removes the last character of the text, if there is one.
+        """
+        if self._chars:
+            self._chars.pop()
+            self._text = None
+
     def render(self, screen):
         """
         Renders the text input.
 
         Args:
         - screen: The screen to render on.
-        """
-        if self.background_image is not None:
-            screen.blit(self.background_image, self.position)
 
+        Returns:
+        - List[pygame.Rect]: The areas of the screen that changed since the last render.
+        """
         display_text = self.text
         if self.is_focused:
             display_text += "|"
         
-        text_surface, _ = self.font.render(display_text, self.text_color)
-        if text_surface.get_width() > (self.width-(self.edge_padding)):
-            text_surface = pygame.transform.scale(text_surface, (self.width-self.edge_padding, text_surface.get_height()))
-        text_rect = text_surface.get_rect(center=(self.position[0] + self.width / 2, self.position[1] + self.height / 2))
-        screen.blit(text_surface, text_rect)
+        composite_key = (self.background_image, display_text, tuple(self.text_color))
+        if composite_key != self._composite_key:
+            text_surface = self.get_text_surface(display_text)
+            composite = self.background_image.copy()
+            composite.blit(text_surface, text_surface.get_rect(center=(self.width / 2, self.height / 2)))
+            self._composite = composite
+            self._composite_key = composite_key
+        drawn_rect = screen.blit(self._composite, self.position)
+        return self.track_dirty_rects((self._composite, tuple(self.position)), drawn_rect)
+
+    def get_text_surface(self, display_text: str) -> pygame.Surface:
+        """
+        Gets the rendered text, squashed to fit if it's too wide. Renders are cached, so this only hits the font when the text or color changes.
 
-    def handle_mouse(self, mouse_position: pygame.Vector2, new_pressed_button_state, held_button_state) -> bool:
+        Args:
+        - display_text (str): The text to render.
+
+        Returns:
+        - pygame.Surface: The rendered text.
+        """
+        key = (display_text, tuple(self.text_color))
+        text_surface = self._render_cache.get(key)
+        if text_surface is None:
+            text_surface, _ = self.font.render(display_text, self.text_color)
+            if text_surface.get_width() > (self.width-(self.edge_padding)):
+                text_surface = pygame.transform.scale(text_surface, (self.width-self.edge_padding, text_surface.get_height()))
+            self._render_cache[key] = text_surface
+            if len(self._render_cache) > self.render_cache_size:
+                self._render_cache.popitem(last=False)
+        return text_surface
+
+    def handle_mouse(self, mouse: MouseFrame) -> bool:
         """
         Handles mouse events.
 
         Args:
-        - mouse_position (pygame.Vector2): The position of the mouse.
-        - new_pressed_button_state: The state of the mouse buttons this frame.
-        - held_button_state: The state of the mouse buttons the previous frame.
+        - mouse (MouseFrame): The state of the mouse this frame.
 
         Returns:
         - bool: Whether the mouse is hovering over the text input.
         """
-        relative_mouse_position = pygame.Vector2(mouse_position) - pygame.Vector2(self.position)
+        relative_x = mouse.pos[0] - self.position[0]
+        relative_y = mouse.pos[1] - self.position[1]
         
         # Check if mouse is within the text input
-        if (0 <= relative_mouse_position.x <= self.width and 0 <= relative_mouse_position.y <= self.height):
-            if new_pressed_button_state != held_button_state and new_pressed_button_state[0]:#this evaluates to true when you click on this with LMB
+        if (0 <= relative_x <= self.width and 0 <= relative_y <= self.height):
+            if mouse.changed and mouse.pressed[0]:#this evaluates to true when you click on this with LMB
                 self.is_focused = True
-            elif new_pressed_button_state != held_button_state and new_pressed_button_state[2]:  # Right mouse button
+            elif mouse.changed and mouse.pressed[2]:  # Right mouse button
                 self.text = clipboard.paste()  # Paste the content of the clipboard
                 if self.on_paste is not None:
                     self.on_paste(self.text)
             return True
         return False
+
+    def get_mouse_area(self) -> pygame.Rect:
+        """
+        Gets the area of the screen where the text input can react to the mouse.
+
+        Returns:
+        - pygame.Rect: The area.
+        """
+        return pygame.Rect(int(self.position[0]), int(self.position[1]), self.width + 2, self.height + 2)
     
-    def handle_key_press(self, key):
+    def handle_key_event(self, event):
         """
-        Handles key values given from elsewhere.
+        Handles a pygame KEYDOWN event. Only control keys are handled here, the typed characters come in through handle_text_event.
 
         Args:
-        - key: The pressed key.
+        - event (pygame.event.Event): The KEYDOWN event.
         """
         if self.is_focused:
-            if key == pynput.keyboard.Key.backspace:
-                self.text = self.text[:-1]
-            elif key == pynput.keyboard.Key.enter:
+            if event.key == pygame.K_BACKSPACE:
+                self.remove_last_character()
+            elif event.key == pygame.K_RETURN or event.key == pygame.K_KP_ENTER:
                 self.is_focused = False
                 if self.on_enter is not None:
                     self.on_enter(self)
-            elif key == pynput.keyboard.Key.space:  # Check if the key is the space bar
-                self.text += ' '  # Append a space to the text
+            elif event.key == pygame.K_v and event.mod & pygame.KMOD_CTRL:  # Same as right clicking
+                self.text = clipboard.paste()
+                if self.on_paste is not None:
+                    self.on_paste(self.text)
+
+    def handle_text_event(self, event):
+        """
+        Handles a pygame TEXTINPUT event. These carry the actual typed text, including shifted characters and composed (IME) input.
+
+        Args:
+        - event (pygame.event.Event): The TEXTINPUT event.
+        """
+        if self.is_focused:
+            typed_text = "".join(character for character in event.text if character.isprintable())
+            if typed_text:
+                self.append_text(typed_text)
                 if self.on_text_change is not None:
                     self.on_text_change(self)
-            else:
-                try:
-                    self.text += key.char
-                    if self.on_text_change is not None:
-                        self.on_text_change(self)
-                except AttributeError:
-                    pass  # Ignore non-character keys
 
 
 #--------------------------------------------------------------------#
@@ -696,7 +1365,7 @@ class TextInput:
 #--------------------------------------------------------------------#
 
 
-class WidgetImage:
+class WidgetImage(DirtyRectTracker):
     """
     basic image that is designed to be included in the Node object's children
     """
@@ -704,10 +1373,15 @@ class WidgetImage:
         self.image = image
         self.position = position
     
-    def handle_mouse(self, mouse_position: pygame.Vector2, new_pressed_button_state, held_button_state) -> bool:
+    def handle_mouse(self, mouse: MouseFrame) -> bool:
         return False
+    def get_mouse_area(self):
+        return pygame.Rect(0, 0, 0, 0) #never reacts to the mouse
     def render(self,screen):
-        screen.blit(self.image,self.position)
+        drawn_rect = screen.blit(self.image,self.position)
+        return self.track_dirty_rects((self.image, drawn_rect.topleft), drawn_rect)
+    def get_blit(self, screen):
+        return (self.image, self.position)
 
 
 #--------------------------------------------------------------------#
@@ -716,29 +1390,117 @@ class WidgetImage:
 
 class Node:
     def __init__(self, children=None):
-        self.children = []
+        self.children = [] #every child in render order, kept flat so render/handle_mouse don't recurse through a Node per layer
+        self._groups = [] #the lists the children were given in (layers), each one still gets its own mouse area
+        self._render_runs = []
+        self._mouse_groups = [] #[mouse area, was the mouse inside last time, children] per group
+        self._mouse_area = None #box around every child that reacts to the mouse, None if some child could react anywhere
         if children is not None:
             self.create_children(children)
 
     def create_children(self, child_list):
         """
-        expects a list of lists
+        expects a list of lists, each inner list is a layer drawn on top of the ones before it
+        """
+        for group in child_list:
+            self.children.extend(group)
+            self._groups.append(list(group))
+        self.build_render_runs()
+        self.update_mouse_area()
+
+    @staticmethod
+    def get_group_mouse_area(group):
         """
-        if child_list:
-            self.children.extend(child_list[0])
-            if len(child_list) > 1:
-                self.children.append(Node(child_list[1:]))
+        Works out the box around every child in group that can react to the mouse.
+        Children without a get_mouse_area method (or that give back None) could react anywhere, so if there are any of those this gives back None.
+        """
+        areas = []
+        for child in group:
+            get_mouse_area = getattr(child, "get_mouse_area", None)
+            area = get_mouse_area() if get_mouse_area is not None else None
+            if area is None:
+                return None
+            if area:#empty rects are children that never react, and would drag the union out to (0, 0)
+                areas.append(area)
+        return areas[0].unionall(areas[1:]) if areas else pygame.Rect(0, 0, 0, 0)
+
+    def update_mouse_area(self):
+        """
+        Works out the mouse area of every group, so handle_mouse can skip a whole layer at once when the mouse is somewhere else.
+        Has to be called again if the children are changed or a child moves.
+        """
+        self._mouse_groups = [[self.get_group_mouse_area(group), True, group] for group in self._groups]
+        self._mouse_area = self.get_group_mouse_area(self.children)
+
+    def get_mouse_area(self):
+        return self._mouse_area
+
+    def build_render_runs(self):
+        """
+        Splits the children into runs, worked out once here instead of every frame. A run is either a list of consecutive children that are just one image
+        (anything with a get_blit method), which get drawn with a single blits call, or a single child that renders itself.
+        Has to be called again if self.children is changed.
+        """
+        self._render_runs = []
+        for child in self.children:
+            if getattr(child, "get_blit", None) is not None:
+                if self._render_runs and isinstance(self._render_runs[-1], list):
+                    self._render_runs[-1].append(child)
+                else:
+                    self._render_runs.append([child])
+            else:
+                self._render_runs.append(child)
     
     def render(self, screen):
-        for child in self.children:
-            child.render(screen)
+        """
+        Renders every child in order and returns all the areas of the screen that changed, ready for pygame.display.update(rects).
+        Runs of children that are just one image are drawn with a single screen.fblits (or screen.blits) call.
+        """
+        dirty_rects = []
+        for run in self._render_runs:
+            if isinstance(run, list):
+                dirty_rects += self.blit_batch(screen, run)
+            else:
+                dirty_rects += run.render(screen)
+        return dirty_rects
+
+    def blit_batch(self, screen, batch_children):
+        """
+        Draws a run of image children with one fblits/blits call.
+        Returns the areas that changed, the same way each child's render would have.
+        """
+        dirty_rects = []
+        batch_blits = []
+        for child in batch_children:
+            blit = child.get_blit(screen)
+            if blit is None:
+                dirty_rects += child.track_dirty_rects(None, None)
+                continue
+            image, position = blit
+            batch_blits.append(blit)
+            #neither fblits nor blits(doreturn=False) hands back rects, but the image and where it went are already known
+            drawn_rect = pygame.Rect(int(position[0]), int(position[1]), *image.get_size())
+            dirty_rects += child.track_dirty_rects((image, drawn_rect.topleft), drawn_rect)
+        if hasattr(screen, "fblits"):#pygame-ce only
+            screen.fblits(batch_blits)
+        else:
+            screen.blits(batch_blits, doreturn=False)
+        return dirty_rects
     
-    def handle_mouse(self, mouse_position: pygame.Vector2, new_pressed_button_state, held_button_state) -> bool:
-        for child in self.children:
-            # print(mouse_position)
-            if child.handle_mouse(mouse_position,new_pressed_button_state,held_button_state):
-                #if the magic function returns true (because the mouse is over it and it's an interactable thing), then stop trying to render in more stuff
-                return True
+    def handle_mouse(self, mouse: MouseFrame) -> bool:
+        for mouse_group in self._mouse_groups:
+            area, was_inside, group = mouse_group
+            if area is not None and not area.collidepoint(mouse.pos):
+                if not was_inside:
+                    continue
+                #the mouse just left, the children still get this one so they can drop their hover states
+                mouse_group[1] = False
+            else:
+                mouse_group[1] = True
+            for child in group:
+                if child.handle_mouse(mouse):
+                    #if the magic function returns true (because the mouse is over it and it's an interactable thing), then stop trying to render in more stuff
+                    return True
         #if nothing was True, then no interactable elements were found in the children, so return False so that if this is a child you can handle that gracefully.
         return False
 
@@ -747,55 +1509,223 @@ class Node:
 #---------------------------- NEW OBJECT ----------------------------#
 #--------------------------------------------------------------------#
 
-import cv2
-class AudioVisualizer:
+class AudioVisualizer(DirtyRectTracker):
     def __init__(self, audio_player, width, height, position:pygame.Vector2 = pygame.Vector2(), line_base_color = (0, 229, 179)):
         self.position = position
         self.width = width
         self.height = height
         self.line_base_color = line_base_color
-        self.display_data = None
         self.audio_player = audio_player
-        self.display_x = []
-        self.display_y = []
         self.audio_chunk_size = 1
+        self.display_data_version = 0 #bumped every time new display data comes in, so render knows the frame changed
+        #(points, column_spans, version), swapped in as one object so the render thread never sees half of one update and half of another. One of these is set:
+        #points is (pixel_x, pixel_y), flat int arrays with one entry per point per channel, ready to index the surface's pixels with
+        #column_spans is (lows, highs), int arrays shaped (width, channels) with the lowest and highest pixel row of every column, for when there's lots of points per column
+        self.display_data = (None, None, self.display_data_version)
+        #all the arrays below get reused every frame instead of being allocated again
+        #display buffers are doubled up so the update thread can write one set while render is still reading the other
+        self._display_buffers = [{}, {}]
+        self._back_buffer_index = 0
+        self._surface = pygame.Surface((self.width, self.height)) #drawn into in place through a pixels2d view whenever new display data comes in
+        self._surface_version = None #the display_data version that's currently drawn on _surface
+        self._frame_buffer = None #the update thread's own copy of the audio player's display frames
+        #used by render to fill the column spans, only touched on the render thread so there's just one set
+        self._rows = np.arange(self.height)
+        self._span_mask = np.empty((self.width, self.height), dtype=bool)
+        self._channel_mask = np.empty((self.width, self.height), dtype=bool)
+        self._below_mask = np.empty((self.width, self.height), dtype=bool)
+
+    def _get_back_buffer(self, name, shape, dtype):
+        """
+        Returns the buffer called name from the set that isn't being displayed right now, only reallocating it when its shape changes.
+
+        Returns:
+            Tuple[np.ndarray, bool]: The buffer and whether it was just made (so its contents are garbage).
+        """
+        buffers = self._display_buffers[self._back_buffer_index]
+        buffer = buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=dtype)
+            buffers[name] = buffer
+            return buffer, True
+        return buffer, False
 
     def update_audio_display_data(self, audio_data, mode="mono"):
         if audio_data is not None:
+            if mode not in ("mono", "channels"):
+                print("Unexpected mode:", mode)
+                mode = "mono"
+            num_points = len(audio_data)
+            num_columns = audio_data.shape[1] if mode == "channels" else 1
+            display_y, _ = self._get_back_buffer("display_y", (num_points, num_columns), np.float32)
             # Stretch the audio data to fit the width of the display
             if mode == "mono":
-                self.display_y = (np.mean(audio_data, axis=1) + 1) / 2 * (self.height-1)
-            elif mode == "channels":
-                num_channels = audio_data.shape[1]
-                channel_height = (self.height-1) / num_channels
-                y = []
-                for i in range(num_channels):
-                    y.append((audio_data[:, i] + 1) / 2 * channel_height + i * channel_height)
-                self.display_y = np.array(y).T
+                np.mean(audio_data, axis=1, out=display_y[:, 0])
+                display_y += 1
+                display_y *= (self.height-1) / 2
             else:
-                print("Unexpected mode:", mode)
-                self.display_y = (np.mean(audio_data, axis=1) + 1) / 2 * (self.height-1)
-            # self.display_x = np.linspace(self.position[0], self.width + self.position[0], len(audio_data))
-            self.display_x = np.linspace(0, self.width-1, len(audio_data))
+                channel_height = (self.height-1) / num_columns
+                # (frames, channels) + (channels,) broadcasts the per channel offsets, so every channel is done in one go
+                np.add(audio_data, 1, out=display_y)
+                display_y *= channel_height / 2
+                display_y += np.arange(num_columns) * channel_height
+            if num_points >= 2*self.width:
+                # at 2+ points per pixel column most of them would just land on pixels that are already lit,
+                # so each column gets a vertical line from its lowest to its highest point instead
+                self.display_data = (None, self.get_column_spans(display_y), self.display_data_version + 1)
+            else:
+                self.display_data = (self.get_points(display_y), None, self.display_data_version + 1)
+            self.display_data_version += 1
+            self._back_buffer_index = 1 - self._back_buffer_index
 
-    def render(self,screen):
-        if len(self.display_x)*len(self.display_y) > 0:
-            # Create a 3D NumPy array to store the pixel data
-            pixel_data = np.zeros((self.width, self.height, 3), dtype=np.uint8)
+    def get_points(self, display_y):
+        """
+        Turns the display data into flat pixel coordinates, one per point per channel. Done here on the update thread, so render doesn't have to convert or clip anything.
+
+        Args:
+            display_y (np.ndarray): The y positions, shaped (points, channels).
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The pixel columns and rows of every point.
+        """
+        num_points, num_columns = display_y.shape
+        pixel_x, is_new = self._get_back_buffer("pixel_x", (num_points*num_columns,), np.intp)
+        buffers = self._display_buffers[self._back_buffer_index]
+        # pixel_x only depends on the number of points and the width, so it's only filled in when one of those changes
+        if is_new or buffers.get("pixel_x_width") != self.width:
+            x_columns = np.clip(np.linspace(0, self.width-1, num_points).astype(np.intp), 0, self.width-1)
+            pixel_x[:] = np.repeat(x_columns, num_columns) #display_y is (points, channels), so every x shows up once per channel when it's flattened
+            buffers["pixel_x_width"] = self.width
+        pixel_y, _ = self._get_back_buffer("pixel_y", (num_points*num_columns,), np.intp)
+        np.copyto(pixel_y, display_y.reshape(-1), casting="unsafe") # truncates like astype does
+        np.clip(pixel_y, 0, self.height-1, out=pixel_y)
+        return pixel_x, pixel_y
+
+    def get_column_spans(self, display_y):
+        """
+        Downsamples the display data to the lowest and highest pixel row in every pixel column (per channel).
+        Every point lands in some column (columns get split at evenly spaced edges, so some hold one more point than others), so the furthest ahead samples aren't dropped.
 
-            # Draw the points onto the pixel data
-            def stack_columns(col):
-                pixel_data[np.clip(np.int_(self.display_x), 0, self.width-1), np.clip(np.int_(col),0,self.height-1)] = self.line_base_color
-            np.apply_along_axis(stack_columns, 0, self.display_y)
+        Args:
+            display_y (np.ndarray): The y positions, shaped (points, channels), with at least one point per pixel column.
 
-            # Convert the pixel data to a cv2 image
-            image = cv2.cvtColor(pixel_data, cv2.COLOR_RGB2BGR)
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The low and high rows, both shaped (width, channels).
+        """
+        num_points = len(display_y)
+        column_starts, is_new = self._get_back_buffer("column_starts", (self.width,), np.intp)
+        buffers = self._display_buffers[self._back_buffer_index]
+        # where each column starts only depends on the number of points and the width
+        if is_new or buffers.get("column_starts_points") != num_points:
+            column_starts[:] = np.linspace(0, num_points, self.width, endpoint=False).astype(np.intp)
+            buffers["column_starts_points"] = num_points
+        shape = (self.width, display_y.shape[1])
+        spans = []
+        for name, reduce in (("low", np.minimum), ("high", np.maximum)):
+            values, _ = self._get_back_buffer(name + "_values", shape, np.float32)
+            reduce.reduceat(display_y, column_starts, axis=0, out=values)
+            rows, _ = self._get_back_buffer(name + "_rows", shape, np.intp)
+            np.copyto(rows, values, casting="unsafe") # truncates like astype does
+            np.clip(rows, 0, self.height-1, out=rows)
+            spans.append(rows)
+        return tuple(spans)
+
+    def start_update_thread(self, mode="mono"):
+        """
+        Starts a daemon thread that waits for the audio player to produce new display frames and turns them into display data.
+        This keeps all of the number crunching off the render loop, which only ever reads the latest finished display_data.
 
-            # Convert the cv2 image to a Pygame Surface
-            surf = pygame.surfarray.make_surface(image)
+        Args:
+            mode (str, optional): The mode passed to update_audio_display_data. Defaults to "mono".
+        """
+        def update_thread():
+            while True:
+                self.audio_player.new_display_frames.wait()
+                self.audio_player.new_display_frames.clear()
+                #read once, the buffer gets sized from this array and the copy has to come from the same one (a new file can change the channel count in between)
+                frames = self.audio_player.display_frame_data
+                if frames is None:
+                    continue
+                try:
+                    #only reallocate when the display data gets bigger or the channel count changes (a new file got loaded)
+                    if self._frame_buffer is None or self._frame_buffer.shape[0] < frames.shape[0] or self._frame_buffer.shape[1:] != frames.shape[1:]:
+                        self._frame_buffer = np.empty(frames.shape, dtype=np.float32)
+                    num_frames = self.audio_player.copy_display_frames_into(self._frame_buffer, frames)
+                    if num_frames > 0:
+                        self.update_audio_display_data(self._frame_buffer[:num_frames], mode=mode)
+                except Exception as error:
+                    #one bad frame shouldn't end the thread, the visualizer would be frozen for the rest of the session
+                    print("Audio visualizer update failed:", error)
+        thread = threading.Thread(target=update_thread, daemon=True)
+        thread.start()
+
+    def render(self,screen):
+        points, column_spans, display_data_version = self.display_data
+        if column_spans is not None or (points is not None and len(points[0]) > 0):
+            if display_data_version != self._surface_version:
+                if column_spans is not None:
+                    self.draw_column_spans(*column_spans)
+                else:
+                    self.draw_points(*points)
+                self._surface_version = display_data_version
 
             # Blit the Surface onto the screen
-            screen.blit(surf, self.position)
+            drawn_rect = screen.blit(self._surface, self.position)
+            return self.track_dirty_rects((display_data_version, drawn_rect.topleft), drawn_rect)
+        return self.track_dirty_rects(None, None)
+
+    def get_line_pixel(self) -> int:
+        """
+        Gets the line color as a pixel value in the visualizer surface's format.
+
+        Returns:
+            int: The mapped line color.
+        """
+        # the line color used to go through a cv2 RGB->BGR conversion, which swapped its channels. The color is reversed here so it still looks the same
+        return self._surface.map_rgb(tuple(self.line_base_color)[::-1])
+
+    def draw_column_spans(self, lows, highs):
+        """
+        Draws a vertical line from low to high in every column onto the visualizer's own surface, which then gets reused for every render until new display data comes in.
+        The lines are filled with a (width, height) mask built by broadcasting the rows against each column's span, so no per pixel index arrays are needed.
+
+        Args:
+            lows (np.ndarray): The lowest row of every column, shaped (width, channels).
+            highs (np.ndarray): The highest row of every column, shaped (width, channels).
+        """
+        for channel in range(lows.shape[1]):
+            channel_mask = self._span_mask if channel == 0 else self._channel_mask
+            np.greater_equal(self._rows, lows[:, channel, None], out=channel_mask)
+            np.less_equal(self._rows, highs[:, channel, None], out=self._below_mask)
+            channel_mask &= self._below_mask
+            if channel > 0:
+                self._span_mask |= channel_mask
+
+        pixel_data = pygame.surfarray.pixels2d(self._surface)
+        # mask * color is the color on the lines and 0 everywhere else, so this clears and draws in one pass
+        np.multiply(self._span_mask, pixel_data.dtype.type(self.get_line_pixel()), out=pixel_data)
+        del pixel_data # the view keeps the surface locked, and a locked surface can't be blitted
+
+    def draw_points(self, pixel_x, pixel_y):
+        """
+        Draws the points onto the visualizer's own surface, which then gets reused for every render until new display data comes in.
+
+        Args:
+            pixel_x (np.ndarray): The pixel columns of the points.
+            pixel_y (np.ndarray): The pixel rows of the points.
+        """
+        line_pixel = self.get_line_pixel()
+
+        # Clear the surface's pixels, this is a view straight into the surface so nothing gets copied
+        pixel_data = pygame.surfarray.pixels2d(self._surface)
+        pixel_data.fill(0)
+
+        # Draw the points onto the pixel data, every channel at once since the coordinates are already flat pixel indices
+        pixel_data[pixel_x, pixel_y] = line_pixel
+        del pixel_data # the view keeps the surface locked, and a locked surface can't be blitted
         
-    def handle_mouse(self, mouse_position: pygame.Vector2, new_pressed_button_state, held_button_state):
+    def handle_mouse(self, mouse: MouseFrame):
         return False
+
+    def get_mouse_area(self):
+        return pygame.Rect(0, 0, 0, 0) #never reacts to the mouse
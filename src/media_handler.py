@@ -3,8 +3,93 @@ import soundfile as sf
 import numpy as np
 import threading
 import os
-import pyloudnorm as pyln
+from scipy import signal
 import requests
+try:
+    from numba import njit
+except ImportError: #numba is optional, normalize_mix falls back to plain numpy without it
+    njit = None
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _normalize_mix_kernel(data, target_loudness, gain, out):
+        flat = data.reshape(-1)
+        out_flat = out.reshape(-1)
+        max_abs = 0.0
+        for i in range(flat.size):
+            if flat[i] == 0:
+                flat[i] = 1e-12
+            value = abs(flat[i])
+            if value > max_abs:
+                max_abs = value
+        scale = (0.9*10.0**(target_loudness/20.0)/max_abs + 0.1)*gain
+        for i in range(flat.size):
+            out_flat[i] = flat[i]*scale
+        return out
+
+    #compile now for the shapes the callback uses (mono and multichannel) instead of stalling the audio thread on the first chunk
+    _normalize_mix_kernel(np.ones(2, dtype=np.float32), -1.0, 1.0, np.empty(2, dtype=np.float32))
+    _normalize_mix_kernel(np.ones((2, 2), dtype=np.float32), -1.0, 1.0, np.empty((2, 2), dtype=np.float32))
+else:
+    _normalize_mix_kernel = None
+
+def normalize_mix(data, target_loudness, gain = 1, out = None):
+    """
+    Peak normalizes audio data to the target loudness and mixes 10% of the original back in. Zero samples get replaced with 1e-12 first (in place).
+    This is (pyloudnorm's normalize.peak(data, target_loudness)*0.9 + 0.1*data)*gain, but since that's just data times a number the scale gets worked out once and applied in a single pass.
+
+    Args:
+        data (np.ndarray): The audio data.
+        target_loudness (float): The target peak loudness in dB.
+        gain (float): Extra gain applied on top, like the volume. Defaults to 1.
+        out (np.ndarray): A contiguous float32 array with the same shape as data to write the result into. A new one gets made if this is None. Defaults to None.
+
+    Returns:
+        np.ndarray: The normalized audio data (out), never data itself so data can be a view into something that shouldn't change.
+    """
+    #floats only, so numba doesn't compile a new version for ints in the middle of playback
+    target_loudness = float(target_loudness)
+    gain = float(gain)
+    if out is None:
+        out = np.empty(data.shape, dtype=np.float32)
+    if _normalize_mix_kernel is not None:
+        return _normalize_mix_kernel(np.ascontiguousarray(data), target_loudness, gain, out)
+    data[data == 0] = 1e-12
+    peak = max(data.max(), -data.min()) #no abs() temporary
+    scale = (0.9*10**(target_loudness/20)/peak + 0.1)*gain
+    return np.multiply(data, scale, out=out)
+
+K_WEIGHTING_CHANNEL_GAINS = (1.0, 1.0, 1.0, 1.41, 1.41) #BS.1770 channel weights, same ones pyloudnorm uses
+
+def k_weighting_sos(sample_rate):
+    """
+    Designs the BS.1770 K-weighting filter (high shelf + high pass, same parameters as pyloudnorm's Meter) as second order sections.
+
+    Args:
+        sample_rate (int): The sample rate of the audio.
+
+    Returns:
+        np.ndarray: The filter as a (2, 6) array of second order sections, usable with scipy.signal.sosfilt.
+    """
+    #high shelf, G = 4dB, Q = 1/sqrt(2), fc = 1500Hz
+    A = 10**(4.0/40)
+    w0 = 2*np.pi*1500.0/sample_rate
+    alpha = np.sin(w0)/(2*(1/np.sqrt(2)))
+    cos_w0 = np.cos(w0)
+    high_shelf = [A*((A+1) + (A-1)*cos_w0 + 2*np.sqrt(A)*alpha),
+                  -2*A*((A-1) + (A+1)*cos_w0),
+                  A*((A+1) + (A-1)*cos_w0 - 2*np.sqrt(A)*alpha),
+                  (A+1) - (A-1)*cos_w0 + 2*np.sqrt(A)*alpha,
+                  2*((A-1) - (A+1)*cos_w0),
+                  (A+1) - (A-1)*cos_w0 - 2*np.sqrt(A)*alpha]
+    #high pass, Q = 0.5, fc = 38Hz
+    w0 = 2*np.pi*38.0/sample_rate
+    alpha = np.sin(w0)/(2*0.5)
+    cos_w0 = np.cos(w0)
+    high_pass = [(1 + cos_w0)/2, -(1 + cos_w0), (1 + cos_w0)/2,
+                 1 + alpha, -2*cos_w0, 1 - alpha]
+    sos = np.array([high_shelf, high_pass])
+    return sos/sos[:, 3:4] #sosfilt wants a0 = 1
 
 class AudioPlayer:
     """
@@ -25,13 +110,17 @@ class AudioPlayer:
         is_stopped (threading.Event): An event that is set when the audio playback is stopped.
         no_audio_loaded (threading.Event): An event that is set when no audio is loaded.
         is_window_focused (threading.Event): An event that is set when the window is focused.
-        display_frame_data (np.ndarray): The current display frame data.
+        display_frame_data (np.ndarray): The current display frame data. Only ever replaced as a whole (never written to while it's the current one), so it can be read without the lock.
+        new_display_frames (threading.Event): An event that is set whenever display_frame_data gets replaced.
         display_skip_rate (int): The rate at which display frames are skipped.
         display_frame_chunk_ratio (int): The ratio of display frames to chunk size.
         current_frame (int): The current frame of the audio playback.
         audio_point_loudness_array (np.ndarray): An array for storing loudness data.
         audio_std_loudness_array (np.ndarray): An array for storing standard deviation loudness data.
+        preload_max_bytes (int): Files whose decoded float32 data fits in this many bytes get read into memory at once instead of read from disk every callback.
     """
+    preload_max_bytes = 512*1024*1024
+
     def __init__(self, normalization_max = -3, normalization_min = -20, normalization_bias = 1/8, volume = 1, inital_audio_path = None, display_frame_chunk_ratio = 50, display_skip_rate = 1):
         """
         Initializes an AudioPlayer object.
@@ -65,6 +154,11 @@ class AudioPlayer:
         self.is_window_focused = threading.Event()
 
         self.display_frame_data = None
+        #the audio callback writes into whichever of these isn't display_frame_data right now and then swaps the reference,
+        #so readers never wait on the lock the callback holds through the loudness calculation
+        self._display_buffers = [None, None]
+        self._display_back_index = 0
+        self.new_display_frames = threading.Event()
         if display_skip_rate > 1:
             self.display_skip_rate = display_skip_rate
         else:
@@ -74,6 +168,43 @@ class AudioPlayer:
 
         self.audio_point_loudness_array = np.zeros((16))
         self.audio_std_loudness_array = np.zeros((16))#arbitrary number wait, won't this fade in with the way we do things?
+        self._k_weighting_rate = None
+        self._k_weighting_sos = None
+        self._k_weighting_state = None #filter state carried between callbacks, None = start from silence
+
+    def reset_loudness_filter(self):
+        """
+        Drops the K-weighting filter state, so the next chunk gets filtered from silence. Needed whenever playback jumps (new file or seek).
+        """
+        with self.lock:
+            self._k_weighting_state = None
+
+    def chunk_loudness(self, audio_data):
+        """
+        Calculates the loudness of a chunk of audio, like pyloudnorm's Meter.integrated_loudness with a one block meter, but streaming:
+        the K-weighting filter state carries over from the previous chunk instead of the filters getting set up and run from scratch every callback.
+
+        Args:
+            audio_data (np.ndarray): The input audio data, (frames,) or (frames, channels).
+
+        Returns:
+            float: The loudness in LUFS.
+        """
+        if self._k_weighting_rate != self.audio_sample_rate:
+            self._k_weighting_sos = k_weighting_sos(self.audio_sample_rate)
+            self._k_weighting_rate = self.audio_sample_rate
+            self._k_weighting_state = None
+        state_shape = (2, 2) + audio_data.shape[1:]
+        if self._k_weighting_state is None or self._k_weighting_state.shape != state_shape:
+            self._k_weighting_state = np.zeros(state_shape)
+        filtered, self._k_weighting_state = signal.sosfilt(self._k_weighting_sos, audio_data, axis=0, zi=self._k_weighting_state)
+
+        mean_square = np.atleast_1d(np.mean(np.square(filtered), axis=0))
+        gains = K_WEIGHTING_CHANNEL_GAINS[:len(mean_square)]
+        power = np.dot(gains, mean_square[:len(gains)])
+        if power <= 0:
+            return -np.inf
+        return -0.691 + 10*np.log10(power)
 
     def find_target_loudness(self, audio_data, input_range = 70, target_dynamic_range = 50, loudness_compression_factor = 1, loudness_upper_limit = 10, std__compression_max = 0.975, std_compression_factor = 0.8, expected_std_max = 3.5):
         """
@@ -92,7 +223,7 @@ class AudioPlayer:
         Returns:
             float: The target loudness.
         """
-        loudness_point = max(min(pyln.Meter(self.audio_sample_rate, block_size=len(audio_data)/self.audio_sample_rate).integrated_loudness(audio_data),0),-input_range)
+        loudness_point = max(min(self.chunk_loudness(audio_data),0),-input_range)
         loudness_point_target_loudness = (((target_dynamic_range-loudness_upper_limit)/target_dynamic_range)
         *target_dynamic_range*((loudness_point+input_range)**(1/loudness_compression_factor))
         *((input_range-1)**((-1)/loudness_compression_factor))-target_dynamic_range)
@@ -136,32 +267,51 @@ class AudioPlayer:
                     audio_info = sf.info(self.audio_path)
                     self.audio_sample_rate = audio_info.samplerate
                     self.audio_frames = audio_info.frames
+                    self.reset_loudness_filter()
+                    #most music fits in memory just fine, so decode it all once and the callback only has to slice.
+                    #bigger files still get read from disk every callback
+                    preloaded_audio = None
+                    if audio_info.frames*audio_info.channels*4 < self.preload_max_bytes:
+                        preloaded_audio = file.read(dtype='float32', always_2d=True)
+                    playback_finished = threading.Event() #set by the callback when it ends the stream, so this thread can sleep until then
                     
                     def callback(in_data, frame_count, time_info, status):
                         self.is_playback_unpaused.wait()#what would be nice is a "wait on this or that" thing
                         if self.is_stopped.is_set():
+                            playback_finished.set()
                             return (None, pyaudio.paComplete)
                         
                         with self.lock:
-                            file.seek(self.current_frame)
+                            start_frame = self.current_frame
                             self.current_frame += frame_count
-                            data = file.read(frames=frame_count, dtype='float32')
-                            target_loudness = self.find_target_loudness(data)#I should really look at the entire file at the start. 
-                            #I tried avoiding that in case I ever want to load something hours long (hence the stream-y ness of this), but it's really hard getting something good with this
-                            data[data == 0] = 1e-12
+                            #the display frames are the ones right after this chunk
+                            display_frame_count = self.display_frame_chunk_ratio*frame_count if self.is_window_focused.is_set() else 0
+                            if preloaded_audio is not None:
+                                frames = preloaded_audio[start_frame:start_frame + frame_count + display_frame_count]
+                            else:
+                                #one read for both, a second read used to be done just for the display frames
+                                file.seek(start_frame)
+                                frames = file.read(frames=frame_count + display_frame_count, dtype='float32', always_2d=True)
+                            #these can be views into preloaded_audio, that's fine since normalize_mix only ever swaps exact zeros for 1e-12 in place
+                            data = frames[:frame_count]
                             if len(data) == 0:
+                                playback_finished.set()
                                 return (None, pyaudio.paComplete)  # Signal end of file
+                            target_loudness = self.find_target_loudness(data)#I should really look at the entire file at the start. 
+                            #I tried avoiding that in case I ever want to load something hours long (hence the stream-y ness of this), but it's really hard getting something good with this
 
-                            if self.is_window_focused.is_set():
-                                try:
-                                    display_frame_data = file.read(frames=self.display_frame_chunk_ratio*frame_count, dtype='float32')
-                                    display_frame_data = display_frame_data[::self.display_skip_rate]
-                                    display_frame_data[display_frame_data == 0] = 1e-12
-                                    self.display_frame_data = pyln.normalize.peak(display_frame_data,target_loudness)*0.9 + 0.1*display_frame_data
-                                except ValueError:
-                                    pass
-                            normalized_data = pyln.normalize.peak(data, target_loudness)*0.9 + 0.1*data
-                            return (normalized_data*self.volume, pyaudio.paContinue)
+                            if display_frame_count > 0:
+                                display_frame_data = frames[frame_count::self.display_skip_rate]
+                                if len(display_frame_data) > 0:
+                                    back_buffer = self._display_buffers[self._display_back_index]
+                                    if back_buffer is None or back_buffer.shape[0] < len(display_frame_data) or back_buffer.shape[1:] != display_frame_data.shape[1:]:
+                                        back_buffer = np.empty(display_frame_data.shape, dtype=np.float32)
+                                        self._display_buffers[self._display_back_index] = back_buffer
+                                    #swapping the reference is atomic, so a reader either gets the old frames or the new ones
+                                    self.display_frame_data = normalize_mix(display_frame_data, target_loudness, out=back_buffer[:len(display_frame_data)])
+                                    self._display_back_index = 1 - self._display_back_index
+                                    self.new_display_frames.set()
+                            return (normalize_mix(data, target_loudness, self.volume), pyaudio.paContinue)
                     stream = p.open(format=pyaudio.paFloat32,
                                     channels=file.channels,
                                     rate=file.samplerate,
@@ -169,7 +319,9 @@ class AudioPlayer:
                                     frames_per_buffer=chunk_size,  # You can adjust this value
                                     stream_callback=callback)
                     stream.start_stream()
-                    while stream.is_active():
+                    #the timeout is just a fallback in case the stream stops some other way (like a device error)
+                    #once the event is set the loop ends, stop_stream already blocks until the output buffers drain so there's no need to spin on is_active
+                    while stream.is_active() and not playback_finished.wait(timeout=0.1):
                         pass
                     stream.stop_stream()
                     stream.close()
@@ -220,6 +372,7 @@ class AudioPlayer:
                 else:
                     #direct frame
                     self.current_frame = int(position)
+                self._k_weighting_state = None
     def set_volume(self,target_volume):
         """
         Sets the volume of the audio playback.
@@ -231,14 +384,33 @@ class AudioPlayer:
             self.volume = min(max(0,target_volume),1)
     def get_display_frames(self):
         """
-        Gets the current display frame data.
+        Gets the current display frame data. No lock needed since display_frame_data only ever gets swapped for a new array.
+        The array gets reused for new frames two callbacks later though, use copy_display_frames_into to keep a copy.
 
         Returns:
             np.ndarray: The current display frame data.
         """
         if self.audio_frames > 0:
-            with self.lock:
-                return self.display_frame_data
+            return self.display_frame_data
+
+    def copy_display_frames_into(self, out, frames = None):
+        """
+        Copies the current display frame data into a buffer the caller owns, so the caller keeps a stable copy without allocating a new one every frame.
+
+        Args:
+            out (np.ndarray): The buffer to copy into. It needs the same number of channels as the display frame data.
+            frames (np.ndarray): The display frame data to copy, for callers that already read display_frame_data (to size out) and need the copy to come from that same array. Defaults to None, which reads display_frame_data.
+
+        Returns:
+            int: The number of frames copied, 0 if there's no display frame data.
+        """
+        if frames is None:
+            frames = self.display_frame_data #read the reference once, the callback can swap it at any point
+        if self.audio_frames <= 0 or frames is None:
+            return 0
+        num_frames = min(len(out), len(frames))
+        np.copyto(out[:num_frames], frames[:num_frames])
+        return num_frames
 
 
 
@@ -252,6 +424,9 @@ import tkinter as tk
 class FileManager:
     def __init__(self):
         self.files_to_be_loaded = None
+        self.version = 0 #goes up every time a new set of files gets picked
+        self.loaded_version = 0 #the version that was last handed to load_media, if these match there's nothing new to load
+        self.lock = threading.RLock()
 
     def open_files(self):
         root = tk.Tk()
@@ -264,12 +439,22 @@ class FileManager:
         files_dict = {}
         for file_path in file_paths:
             files_dict[file_path] = os.path.splitext(os.path.basename(file_path))[0]
-        self.files_to_be_loaded = files_dict
+        with self.lock:
+            self.files_to_be_loaded = files_dict
+            self.version += 1
 
     def load_media(self,media_display,default_image, font, extra_images):
-        if self.files_to_be_loaded is not None:
-            media_display.update_buttons(self.files_to_be_loaded, default_image=default_image, font=font, extra_images=extra_images)
+        #this gets called every frame, so bail out with a single int compare unless open_files picked something new
+        #returns True when the media display got new buttons
+        if self.loaded_version == self.version:
+            return False
+        with self.lock:
+            files_to_be_loaded = self.files_to_be_loaded
             self.files_to_be_loaded = None
+            self.loaded_version = self.version
+        if files_to_be_loaded is not None:
+            media_display.update_buttons(files_to_be_loaded, default_image=default_image, font=font, extra_images=extra_images)
+        return True
 
 
 
@@ -289,6 +474,7 @@ class YoutubeManager:
         self.temp_file_path = os.path.dirname(__file__) + "\Temp Files"
         self.download_progress = 1
         self.lock = threading.RLock()
+        self.is_downloading = threading.Event() #set while a download thread is running, so nobody has to poll progress when nothing is happening
     def set_mode(self,target_mode):
         if target_mode in self.supported_modes:
             self.mode = target_mode
@@ -312,29 +498,34 @@ class YoutubeManager:
         file_path = None
         def start_download():
             nonlocal output_file_path
-            def progress_callback(stream, chunk, bytes_remaining):
-                total_size = stream.filesize
-                bytes_downloaded = total_size - bytes_remaining
-                percentage_of_completion = bytes_downloaded / total_size
-                # print(percentage_of_completion)
-                self.download_progress = percentage_of_completion
-            yt.register_on_progress_callback(progress_callback)
-            #this is unfinished but also don't focus on this it's not that important
-            file_path = audio_stream.download(output_path=self.temp_file_path)
-            output_file_path =  os.path.join(download_path, os.path.splitext(os.path.basename(file_path))[0] + ".mp3")
-            command = [
-                'ffmpeg',
-                '-i', file_path,
-                '-y', #overwrite
-                '-vn',  # No video
-                '-acodec', 'libmp3lame',  # MP3 codec
-                '-q:a', '2',  # Quality level (2 is high quality)
-                output_file_path
-            ]
-            with open(os.devnull, 'wb') as devnull:
-                subprocess.run(command, stdout=devnull, stderr=devnull)
-            for file in os.listdir(self.temp_file_path):
-                os.remove(os.path.join(self.temp_file_path, file))
+            try:
+                def progress_callback(stream, chunk, bytes_remaining):
+                    total_size = stream.filesize
+                    bytes_downloaded = total_size - bytes_remaining
+                    percentage_of_completion = bytes_downloaded / total_size
+                    # print(percentage_of_completion)
+                    with self.lock:
+                        self.download_progress = percentage_of_completion
+                yt.register_on_progress_callback(progress_callback)
+                #this is unfinished but also don't focus on this it's not that important
+                file_path = audio_stream.download(output_path=self.temp_file_path)
+                output_file_path =  os.path.join(download_path, os.path.splitext(os.path.basename(file_path))[0] + ".mp3")
+                command = [
+                    'ffmpeg',
+                    '-i', file_path,
+                    '-y', #overwrite
+                    '-vn',  # No video
+                    '-acodec', 'libmp3lame',  # MP3 codec
+                    '-q:a', '2',  # Quality level (2 is high quality)
+                    output_file_path
+                ]
+                with open(os.devnull, 'wb') as devnull:
+                    subprocess.run(command, stdout=devnull, stderr=devnull)
+                for file in os.listdir(self.temp_file_path):
+                    os.remove(os.path.join(self.temp_file_path, file))
+            finally:
+                self.is_downloading.clear()
+        self.is_downloading.set()
         download_thread = threading.Thread(target=start_download, daemon=True)
         download_thread.start()
     def check_download_progress(self):